@@ -0,0 +1,110 @@
+#!/usr/bin/python3
+# One entry point for the analysis scripts of the thesis
+#
+# Every subcommand imports what it needs when it runs: statistics only load
+# NumPy, sqlite3 and the reduction modules of results/qtaim/img, while
+# matplotlib and seaborn are only imported when a figure is asked for with
+# --plot. Databases are given with --db (paths or glob patterns).
+#
+# Usage: ./analysis.py dipole-stats --db q_dp_pol.db [--plot [file.pdf]]
+#        ./analysis.py pol-stats --db pol_150.db [--plot [file.pdf]]
+#        ./analysis.py memory-model [--db q_dp_pol.db] [--plot [file.pdf]]
+#        ./analysis.py basis-plot basis_dir [--element H] [--plot [file.pdf]]
+import os
+import sys
+import argparse
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+# Directories of the modules behind the subcommands
+MODULES = [os.path.join(ROOT, 'results', 'qtaim', 'img'),
+           os.path.join(ROOT, 'methodology', 'foundations', 'plt')]
+
+
+def dipole_stats(args):
+    import dipolemoment_histo as histo
+    stats, nsystems = histo.statistics(args.db, args.cache, args.workers)
+    histo.report(stats, nsystems)
+    if args.plot:
+        histo.plot(stats, args.plot)
+
+
+def pol_stats(args):
+    import plot_pol_aimall_adf as histo
+    stats, _ = histo.statistics(args.db, args.cache, args.workers)
+    histo.report(stats)
+    if args.plot:
+        histo.plot(stats, args.plot)
+
+
+def memory_model(args):
+    import numpy as np
+    import memory
+    if args.db:
+        natoms = memory.read_natoms(args.db, args.where)
+        _, counts, plan = memory.plan_memory(natoms)
+        memory.report(natoms, plan)
+        if args.plot:
+            memory.plot_plan(counts, plan, args.plot)
+        return
+    sizes = np.array(args.natoms)
+    print(f"{'natoms':>36}" + "".join(f"{n:>10}" for n in sizes))
+    for label, values in memory.model_memory(sizes).items():
+        print(f"{label:<36}" + "".join(f"{v:10.2f}" for v in values))
+    if args.plot:
+        memory.create_plot(use_log_scale=True).savefig(args.plot)
+
+
+def basis_plot(args):
+    from basis_library import BasisLibrary, summary, plot_library
+    library = BasisLibrary(args.directory)
+    rows = summary(library, args.element)
+    print(f"=== {args.element.upper()} IN {len(rows)} BASIS SETS ===")
+    for name, shells, nprim in rows:
+        print(f"{name:<20} {shells:<12} {nprim:>4} primitives")
+    if args.plot:
+        plot_library(library, args.element, args.plot)
+
+
+def parser():
+    main = argparse.ArgumentParser(description="Analysis of the QTAIM databases")
+    commands = main.add_subparsers(dest='command', required=True)
+
+    def command(name, function, figure, help):
+        sub = commands.add_parser(name, help=help)
+        sub.add_argument('--plot', nargs='?', const=figure, metavar='FILE',
+                         help=f"also draw the figure ({figure})")
+        sub.set_defaults(function=function)
+        return sub
+
+    for name, function, figure, what in [
+            ('dipole-stats', dipole_stats, 'histogram_dipole_total.pdf',
+             "ADF - AIMAll dipole moment differences"),
+            ('pol-stats', pol_stats, 'histogram_polarisability.pdf',
+             "ADF - AIMAll polarisability differences")]:
+        sub = command(name, function, figure, what)
+        sub.add_argument('--db', nargs='+', action='extend', required=True,
+                         help="databases (paths or glob patterns)")
+        sub.add_argument('--workers', type=int, help="processes (one per core)")
+        sub.add_argument('--cache', default='.qtaim_cache',
+                         help="cache of the extracted columns")
+        sub.add_argument('--no-cache', dest='cache', action='store_const', const=None)
+
+    sub = command('memory-model', memory_model, 'memory_optimisation_curve.pdf',
+                  "maxCP memory of the models (of the systems of --db)")
+    sub.add_argument('--db', nargs='+', action='extend',
+                     help="databases: predicted memory of their systems")
+    sub.add_argument('--where', help="filter on the systems table")
+    sub.add_argument('--natoms', type=int, nargs='+', default=[10, 50, 100, 200, 500],
+                     help="sizes of the table without --db")
+
+    sub = command('basis-plot', basis_plot, 'gauss_slater_library.pdf',
+                  "s shells of an element in a basis-set library")
+    sub.add_argument('directory', help="directory of .gbs/.nw files")
+    sub.add_argument('--element', default='H')
+    return main
+
+
+if __name__ == "__main__":
+    args = parser().parse_args()
+    sys.path[1:1] = MODULES
+    args.function(args)
@@ -0,0 +1,82 @@
+#!/usr/bin/python3
+# Graphs drawn on one reused figure (appendix copy)
+#
+# Trimmed copy of methodology/qtaim/img/graph_render.py for graphs.py: the
+# figure, the node scatter, the edge LineCollection and the label texts are
+# created once and every graph only updates their data before it is saved
+# to its own file. Keep the style in step with the methodology version.
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+
+STYLE = dict(node_size=9000, node_color='white', edgecolors='black',
+             font_size=36, font_weight='bold', edge_color='black',
+             width=5, linewidths=5)
+
+
+class GraphRenderer:
+    """One figure whose artists are updated for every graph
+
+    Use as a context manager (or call close()).
+    """
+
+    def __init__(self, figsize=(8, 8), style=None, margin=0.05, rect=(0, 0, 1, 1)):
+        self.style = dict(STYLE, **(style or {}))
+        self.margin = margin
+        # Whole-figure axes, as nx.draw creates them
+        self.fig = plt.figure(figsize=figsize)
+        self.ax = self.fig.add_axes(rect)
+        self.ax.set_axis_off()
+        s = self.style
+        self.edges = self.ax.add_collection(LineCollection(
+            [], colors=s['edge_color'], linewidths=s['width'], zorder=1))
+        self.nodes = self.ax.scatter([], [], s=s['node_size'], c=s['node_color'],
+                                     edgecolors=s['edgecolors'],
+                                     linewidths=s['linewidths'], zorder=2)
+        self.labels = []
+        self.title = self.ax.set_title("", fontsize=16, fontweight='bold', pad=20)
+
+    def _label(self, i):
+        # Texts are created once and reused by the next graphs
+        while len(self.labels) <= i:
+            self.labels.append(self.ax.text(0, 0, "", ha='center', va='center',
+                                            fontsize=self.style['font_size'],
+                                            fontweight=self.style['font_weight'],
+                                            zorder=3))
+        return self.labels[i]
+
+    def render(self, positions, edges, title, filename):
+        """Draw positions {node: (x, y)} and edges [(node, node)] into `filename`"""
+        labels = list(positions)
+        xy = np.array([positions[n] for n in labels], dtype=float)
+        index = {n: i for i, n in enumerate(labels)}
+        pairs = np.array([[index[a], index[b]] for a, b in edges],
+                         dtype=np.int64).reshape(-1, 2)
+
+        self.nodes.set_offsets(xy)
+        self.edges.set_segments(xy[pairs])
+        for i, (label, (x, y)) in enumerate(zip(labels, xy)):
+            text = self._label(i)
+            text.set_text(str(label))
+            text.set_position((x, y))
+            text.set_visible(True)
+        for text in self.labels[len(labels):]:
+            text.set_visible(False)
+        self.title.set_text(title)
+
+        # Same view as nx.draw: edges padded by `margin`, then the axes margins
+        low, high = xy.min(axis=0), xy.max(axis=0)
+        width = np.where(high > low, high - low, 1)
+        pad = width*(self.margin + np.array(self.ax.margins())*(1 + 2*self.margin))
+        self.ax.set_xlim(low[0] - pad[0], high[0] + pad[0])
+        self.ax.set_ylim(low[1] - pad[1], high[1] + pad[1])
+        self.fig.savefig(filename)
+
+    def close(self):
+        plt.close(self.fig)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,24 +1,13 @@
 #!/usr/bin/python3
-import matplotlib.pyplot as plt
 import networkx as nx
 
-# Common styling function
+# Common styling: one figure reused by every graph (graph_render.py)
+from graph_render import GraphRenderer
+
+renderer = GraphRenderer(figsize=(8, 8))
+
 def draw_graph(G, positions, title, filename):
-    plt.figure(figsize=(8, 8))
-    nx.draw(
-        G, positions,
-        with_labels=True,
-        node_size=9000,      # Size of circles
-        node_color='white',
-        edgecolors='black',
-        font_size=36,
-        font_weight='bold',
-        edge_color='black',
-        width=5,             # Width of edges
-        linewidths=5,        # Width of node borders
-    )
-    plt.title(title, fontsize=16, fontweight='bold', pad=20)
-    plt.savefig(filename)
+    renderer.render(positions, G.edges(), title, filename)
 
 # 1. Zigzag Chain [A-B-C-D] - flatter, more horizontal
 G1 = nx.Graph()
@@ -75,3 +64,5 @@ pyramid_edges = [("A", "B"), ("B", "C"), ("C", "A"), ("D", "A"), ("D", "B"), ("D
 G4.add_edges_from(pyramid_edges)
 draw_graph(G4, pyramid_positions, "Pyramid Projection: Triangle ABC with center D", "pyramid_graph.pdf")
 
+
+renderer.close()
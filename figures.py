@@ -0,0 +1,332 @@
+#!/usr/bin/python3
+# Incremental, parallel build of the figures (make plots, svg and img)
+#
+# Every job is a figure script, run from its own directory as its relative
+# savefig paths expect, or an SVG converted to PDF by rsvg-convert. The
+# manifest (.figures.json) keeps, for every job, its inputs with their
+# content hash and the outputs it wrote. The inputs of a script are the
+# script, the local modules it imports and every file it opens for reading
+# (SQLite databases included), as recorded by an audit hook; the input of
+# an SVG job is the SVG.
+#
+# A job is rebuilt when one of its inputs changed or one of its outputs is
+# missing. Hashes are only recomputed when the size or mtime of a file
+# changed, so an up-to-date tree costs one stat per input.
+#
+# Stale jobs run in parallel on warm workers: processes that import
+# matplotlib (Agg), seaborn, sklearn, networkx, ... once and then run
+# script after script, each in a fresh namespace, closing the figures and
+# restoring the rcParams in between. With --cold every script gets its own
+# interpreter instead.
+#
+# Usage: ./figures.py [-j N] [--force] [--dry-run] [-v] [--cold] script.py drawing.svg ...
+import io
+import os
+import sys
+import json
+import time
+import runpy
+import hashlib
+import argparse
+import tempfile
+import importlib
+import traceback
+import subprocess
+from contextlib import redirect_stdout, redirect_stderr
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+MANIFEST = os.path.join(ROOT, '.figures.json')
+
+# Libraries imported once by every warm worker
+PRELOAD = ['numpy', 'scipy.special', 'scipy.stats', 'matplotlib.pyplot', 'seaborn',
+           'pandas', 'networkx', 'sklearn.svm', 'sklearn.linear_model']
+WRITE = os.O_WRONLY | os.O_RDWR | os.O_CREAT | os.O_APPEND
+
+# Files read and written by the script running in this process
+_trace = None
+# rcParams of a fresh warm worker
+_rc = None
+
+
+def _hook(event, args):
+    if _trace is None or not isinstance(args[0], (str, bytes, os.PathLike)):
+        return
+    reads, writes = _trace
+    if event == 'open':
+        mode, flags = args[1], args[2]
+        write = any(c in mode for c in 'wax+') if mode else flags & WRITE
+        (writes if write else reads).add(os.path.abspath(os.fsdecode(args[0])))
+    elif event == 'sqlite3.connect':
+        path = os.fsdecode(args[0])
+        if path.startswith('file:'):
+            path = path[5:].split('?')[0]
+        if path and path != ':memory:':
+            reads.add(os.path.abspath(path))
+
+
+def execute(script):
+    """Run a script as __main__ in this process: (reads, writes, output)
+
+    The script runs from its directory in a fresh namespace; the local
+    modules it imported are dropped afterwards, so the next script gets
+    its own copies. _hook has to be installed.
+    """
+    global _trace
+    folder = os.path.dirname(script)
+    cwd, path, argv, modules = os.getcwd(), sys.path[:], sys.argv, set(sys.modules)
+    os.chdir(folder)
+    sys.path.insert(0, folder)
+    sys.argv = [script]
+    _trace = reads, writes = set(), set()
+    output = io.StringIO()
+    try:
+        with redirect_stdout(output), redirect_stderr(output):
+            runpy.run_path(script, run_name='__main__')
+    except SystemExit as e:
+        if e.code:
+            raise RuntimeError(f"{output.getvalue()}exit status {e.code}")
+    except Exception:
+        raise RuntimeError(output.getvalue() + traceback.format_exc())
+    finally:
+        _trace = None
+        for name in set(sys.modules) - modules:
+            file = getattr(sys.modules[name], '__file__', None)
+            if isinstance(file, str) and file.startswith(ROOT + os.sep):
+                reads.add(os.path.abspath(file))
+                del sys.modules[name]
+        os.chdir(cwd)
+        sys.path[:], sys.argv = path, argv
+    return reads, writes, output.getvalue()
+
+
+def warm_up():
+    """Pool initializer: Agg backend and the heavy imports, once per worker"""
+    global _rc
+    os.environ['MPLBACKEND'] = 'Agg'
+    sys.addaudithook(_hook)
+    for name in PRELOAD:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    import matplotlib
+    _rc = matplotlib.rcParams.copy()
+
+
+def reset():
+    """Close the figures and restore the rcParams left by a script"""
+    import matplotlib
+    import matplotlib.pyplot as plt
+    plt.close('all')
+    matplotlib.rcParams.update(_rc)
+
+
+def trace(script, report):
+    """Cold job: execute a script in this fresh interpreter, trace to `report`"""
+    sys.addaudithook(_hook)
+    try:
+        reads, writes, output = execute(script)
+    except RuntimeError as e:
+        sys.stderr.write(str(e))
+        sys.exit(1)
+    sys.stdout.write(output)
+    with open(report, 'w') as f:
+        json.dump({'reads': sorted(reads), 'writes': sorted(writes)}, f)
+
+
+def relative(path):
+    return os.path.relpath(os.path.abspath(path), ROOT)
+
+
+def hidden(path):
+    """Caches and bytecode (.sto_cache, __pycache__, ...) are not tracked"""
+    return any(part.startswith('.') or part == '__pycache__'
+               for part in path.split(os.sep)[:-1])
+
+
+class Hasher:
+    """Content hashes, recomputed only when (size, mtime) changed"""
+
+    def __init__(self, known):
+        self.known = known
+        self.seen = {}
+
+    def stamp(self, path):
+        """[size, mtime_ns, sha256] of a file (relative to ROOT), None if missing"""
+        if path in self.seen:
+            return self.seen[path]
+        try:
+            st = os.stat(os.path.join(ROOT, path))
+        except OSError:
+            self.seen[path] = None
+            return None
+        old = self.known.get(path)
+        if old and old[:2] == [st.st_size, st.st_mtime_ns]:
+            stamp = old
+        else:
+            digest = hashlib.sha256()
+            with open(os.path.join(ROOT, path), 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+            stamp = [st.st_size, st.st_mtime_ns, digest.hexdigest()]
+        self.seen[path] = stamp
+        return stamp
+
+    def changed(self, path, recorded):
+        """Did the content of `path` change since `recorded`?"""
+        stamp = self.stamp(path)
+        if stamp is None or stamp[2] != recorded[2]:
+            return True
+        # Same content with a new mtime (touch, checkout): refresh the stamp
+        recorded[:2] = stamp[:2]
+        return False
+
+
+def stale(job, entry, hasher):
+    """Reason for rebuilding a job, None when it is up to date"""
+    if entry is None:
+        return "new"
+    for output in entry['outputs']:
+        if not os.path.exists(os.path.join(ROOT, output)):
+            return f"{output} missing"
+    for path, recorded in entry['inputs'].items():
+        if hasher.changed(path, recorded):
+            return f"{path} changed"
+    return None
+
+
+def run_script(job):
+    """Run a figure script in its directory: (inputs, outputs, log)
+
+    In a warm worker the script runs in the worker itself, otherwise in a
+    new interpreter.
+    """
+    script = os.path.join(ROOT, job)
+    if _rc is not None:
+        try:
+            reads, writes, log = execute(script)
+        finally:
+            reset()
+    else:
+        fd, report = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        try:
+            command = [sys.executable, os.path.abspath(__file__), '--trace', report, script]
+            proc = subprocess.run(command, capture_output=True, text=True,
+                                  env=dict(os.environ, MPLBACKEND='Agg'))
+            if proc.returncode:
+                raise RuntimeError(proc.stdout + proc.stderr)
+            with open(report) as f:
+                files = json.load(f)
+            reads, writes = files['reads'], files['writes']
+        finally:
+            os.remove(report)
+        log = proc.stdout
+    inside = lambda paths: {relative(p) for p in paths if p.startswith(ROOT + os.sep)}
+    writes = inside(writes)
+    reads = inside(reads) - writes
+    inputs = sorted({job} | {p for p in reads if not hidden(p) and os.path.isfile(p)})
+    outputs = sorted(p for p in writes if not hidden(p))
+    return inputs, outputs, log
+
+
+def run_svg(job):
+    """SVG to PDF next to it"""
+    output = job[:-4] + '.pdf'
+    proc = subprocess.run(['rsvg-convert', '-f', 'pdf', '-o', output, job],
+                          cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode:
+        raise RuntimeError(proc.stderr)
+    return [job], [output], proc.stdout
+
+
+def run(job):
+    start = time.perf_counter()
+    inputs, outputs, log = (run_svg if job.endswith('.svg') else run_script)(job)
+    return inputs, outputs, log, time.perf_counter() - start
+
+
+def load(manifest):
+    try:
+        with open(manifest) as f:
+            return json.load(f)['jobs']
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def save(jobs, manifest):
+    # Atomic replace: an interrupted build never leaves a broken manifest
+    with open(manifest + '.tmp', 'w') as f:
+        json.dump({'jobs': jobs}, f, indent=1, sort_keys=True)
+    os.replace(manifest + '.tmp', manifest)
+
+
+def build(paths, workers=None, force=False, dry_run=False, verbose=False,
+          warm=True, manifest=MANIFEST):
+    """Rebuild the stale jobs of `paths`, returns the number of failures"""
+    paths = dict.fromkeys(relative(p) for p in paths)
+    os.chdir(ROOT)
+    jobs = load(manifest)
+    hasher = Hasher({path: stamp for entry in jobs.values()
+                     for path, stamp in entry['inputs'].items()})
+    todo = {}
+    for job in paths:
+        reason = "forced" if force else stale(job, jobs.get(job), hasher)
+        if reason:
+            todo[job] = reason
+    if dry_run or not todo:
+        for job, reason in todo.items():
+            print(f"  stale {job} ({reason})")
+        if not dry_run:
+            save(jobs, manifest)  # refreshed mtimes
+            print(f"{len(jobs)} figure jobs up to date")
+        return 0
+
+    failures = 0
+    start = time.perf_counter()
+    workers = min(workers or os.cpu_count(), len(todo))
+    if warm and not all(job.endswith('.svg') for job in todo):
+        pool = ProcessPoolExecutor(workers, initializer=warm_up)
+    else:
+        pool = ThreadPoolExecutor(workers)
+    with pool:
+        futures = {job: pool.submit(run, job) for job in todo}
+        for job, future in futures.items():
+            try:
+                inputs, outputs, log, seconds = future.result()
+            except Exception as e:
+                failures += 1
+                jobs.pop(job, None)
+                print(f"  FAILED {job}\n{e}", file=sys.stderr)
+                continue
+            hasher.seen.clear()
+            jobs[job] = {'inputs': {p: hasher.stamp(p) for p in inputs},
+                         'outputs': outputs}
+            print(f"  built {job} ({todo[job]}, {seconds:.1f} s): {', '.join(outputs)}")
+            if verbose and log:
+                print(log, end='')
+            save(jobs, manifest)
+    print(f"{len(todo) - failures} of {len(todo)} jobs built in "
+          f"{time.perf_counter() - start:.1f} s ({workers} "
+          f"{'warm ' if isinstance(pool, ProcessPoolExecutor) else ''}workers)")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('paths', nargs='+', help="figure scripts and SVG files")
+    parser.add_argument('-j', '--jobs', type=int, help="parallel jobs (all cores)")
+    parser.add_argument('--force', action='store_true', help="rebuild everything")
+    parser.add_argument('--dry-run', action='store_true', help="only list stale jobs")
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help="show the output of the scripts")
+    parser.add_argument('--cold', action='store_true',
+                        help="a new interpreter per script instead of warm workers")
+    parser.add_argument('--trace', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.trace:
+        trace(os.path.abspath(args.paths[0]), args.trace)
+        sys.exit(0)
+    sys.exit(1 if build(args.paths, args.jobs, args.force, args.dry_run,
+                        args.verbose, not args.cold) else 0)
@@ -0,0 +1,216 @@
+#!/usr/bin/python3
+# Basis-set library: Gaussian (.gbs) and NWChem (.nw) files of a directory
+# parsed once into flat arrays with an index by basis name and element.
+#
+# The arrays (exponents, coefficients and the shell table) are kept as .npy
+# files in a cache directory together with index.json; they are memory
+# mapped on the next loads and only re-parsed when a file of the library
+# changes (size or mtime).
+import os
+import re
+import json
+import glob
+import numpy as np
+from gto import Basis
+
+ANGULAR = {'S': 0, 'P': 1, 'D': 2, 'F': 3, 'G': 4, 'H': 5, 'I': 6}
+EXTENSIONS = {'.gbs': 'gaussian', '.nw': 'nwchem', '.nwchem': 'nwchem'}
+
+
+def _numbers(line):
+    # Fortran exponents (1.0D+01) included
+    return [float(x) for x in line.replace('D', 'E').replace('d', 'e').split()]
+
+
+def _element(symbol):
+    return symbol.strip('-').capitalize()
+
+
+def parse_gaussian(text):
+    """{element: [(l, exponents, coefficients), ...]} of a .gbs file"""
+    shells = {}
+    element = None
+    lines = iter(text.splitlines())
+    for line in lines:
+        words = line.split()
+        if not words or line.lstrip().startswith('!'):
+            continue
+        if words[0] == '****':
+            element = None
+        elif element is None:
+            # "C     0" starts an element
+            if len(words) == 2 and words[1] == '0' and words[0].strip('-').isalpha():
+                element = _element(words[0])
+                shells.setdefault(element, [])
+        elif words[0].upper() in ANGULAR or words[0].upper() == 'SP':
+            kind, nprim = words[0].upper(), int(words[1])
+            rows = np.array([_numbers(next(lines)) for _ in range(nprim)])
+            if kind == 'SP':
+                shells[element].append((0, rows[:,0], rows[:,1]))
+                shells[element].append((1, rows[:,0], rows[:,2]))
+            else:
+                # General contractions give one shell per coefficient column
+                for col in range(1, rows.shape[1]):
+                    shells[element].append((ANGULAR[kind], rows[:,0], rows[:,col]))
+    return shells
+
+
+def parse_nwchem(text):
+    """{element: [(l, exponents, coefficients), ...]} of an NWChem basis block"""
+    shells = {}
+    current, rows = None, []
+
+    def flush():
+        if current is None or not rows:
+            return
+        element, kind = current
+        table = np.array(rows)
+        if kind == 'SP':
+            shells[element].append((0, table[:,0], table[:,1]))
+            shells[element].append((1, table[:,0], table[:,2]))
+        else:
+            for col in range(1, table.shape[1]):
+                shells[element].append((ANGULAR[kind], table[:,0], table[:,col]))
+
+    for line in text.splitlines():
+        words = line.split()
+        if not words or words[0].startswith('#'):
+            continue
+        if words[0].upper() in ('BASIS', 'END'):
+            flush()
+            current, rows = None, []
+        elif len(words) == 2 and re.fullmatch(r'[A-Za-z]{1,3}', words[0]) \
+                and words[1].upper() in list(ANGULAR) + ['SP']:
+            flush()
+            current, rows = (_element(words[0]), words[1].upper()), []
+            shells.setdefault(current[0], [])
+        elif current is not None:
+            rows.append(_numbers(line))
+    flush()
+    return shells
+
+
+def parse_file(path):
+    """Shells of a basis file, format from the extension"""
+    with open(path) as f:
+        text = f.read()
+    kind = EXTENSIONS[os.path.splitext(path)[1].lower()]
+    return parse_gaussian(text) if kind == 'gaussian' else parse_nwchem(text)
+
+
+class BasisLibrary:
+    """Indexed, cached store of all the basis files of a directory
+
+    Basis names are the file names without extension (sto-3g.gbs -> 'sto-3g').
+    """
+
+    def __init__(self, directory, cache=None):
+        self.directory = directory
+        self.cache = cache or os.path.join(directory, '.basis_cache')
+        files = sorted(p for p in glob.glob(os.path.join(directory, '*'))
+                       if os.path.splitext(p)[1].lower() in EXTENSIONS)
+        stamps = {os.path.basename(p): [os.path.getsize(p), os.stat(p).st_mtime_ns]
+                  for p in files}
+        if not self._load(stamps):
+            self._build(files, stamps)
+            self._load(stamps)
+
+    def _load(self, stamps):
+        try:
+            with open(os.path.join(self.cache, 'index.json')) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if index['files'] != stamps:
+            return False
+        self.index = index['entries']
+        # (l, first primitive, number of primitives) of every shell
+        self.table = np.load(os.path.join(self.cache, 'shells.npy'), mmap_mode='r')
+        self.exponents = np.load(os.path.join(self.cache, 'exponents.npy'), mmap_mode='r')
+        self.coefficients = np.load(os.path.join(self.cache, 'coefficients.npy'),
+                                    mmap_mode='r')
+        return True
+
+    def _build(self, files, stamps):
+        exponents, coefficients, table, entries = [], [], [], {}
+        start = 0
+        for path in files:
+            name = os.path.splitext(os.path.basename(path))[0].lower()
+            entries[name] = {}
+            for element, shells in parse_file(path).items():
+                first = len(table)
+                for l, alpha, coef in shells:
+                    table.append((l, start, len(alpha)))
+                    exponents.append(alpha)
+                    coefficients.append(coef)
+                    start += len(alpha)
+                entries[name][element] = [first, len(table)]
+        os.makedirs(self.cache, exist_ok=True)
+        np.save(os.path.join(self.cache, 'exponents.npy'),
+                np.concatenate(exponents) if exponents else np.empty(0))
+        np.save(os.path.join(self.cache, 'coefficients.npy'),
+                np.concatenate(coefficients) if coefficients else np.empty(0))
+        np.save(os.path.join(self.cache, 'shells.npy'),
+                np.array(table, dtype=np.int64).reshape(-1, 3))
+        # Written last: the arrays are only used with a matching index
+        with open(os.path.join(self.cache, 'index.json'), 'w') as f:
+            json.dump({'files': stamps, 'entries': entries}, f)
+
+    def names(self):
+        return sorted(self.index)
+
+    def elements(self, name):
+        return list(self.index[name.lower()])
+
+    def shells(self, name, element, l=None):
+        """[(l, exponents, coefficients), ...] of an element in a basis"""
+        first, last = self.index[name.lower()][_element(element)]
+        shells = []
+        for ang, start, nprim in self.table[first:last]:
+            if l is None or ang == l:
+                shells.append((int(ang), self.exponents[start:start + nprim],
+                               self.coefficients[start:start + nprim]))
+        return shells
+
+    def basis(self, name, element, l=None):
+        """gto.Basis with the contractions of an element (optionally one l)"""
+        shells = self.shells(name, element, l)
+        return Basis([(alpha, coef) for _, alpha, coef in shells],
+                     l=[ang for ang, _, _ in shells],
+                     labels=[f"{name} {element} {'SPDFGHI'[ang]}" for ang, _, _ in shells])
+
+
+def summary(library, element='H'):
+    """(basis, shells like '3s2p1d', primitives) of an element in every basis"""
+    rows = []
+    for name in library.names():
+        if _element(element) not in library.elements(name):
+            continue
+        shells = library.shells(name, element)
+        counts = np.bincount([ang for ang, _, _ in shells], minlength=1)
+        composition = ''.join(f"{n}{'spdfghi'[ang]}" for ang, n in enumerate(counts) if n)
+        rows.append((name, composition, sum(len(alpha) for _, alpha, _ in shells)))
+    return rows
+
+
+def plot_library(library, element='H', filename="gauss_slater_library.pdf"):
+    """Radial distribution of the first s contraction of every basis vs Slater 1s"""
+    import matplotlib.pyplot as plt
+    r = np.linspace(0, 8, 400)
+    slater = np.exp(-r)/np.sqrt(np.pi)
+    plt.figure(figsize=(8,5))
+    plt.xlim(0, 6)
+    plt.plot(r, 4.0*np.pi*r**2*slater**2, label="Slater 1s", lw=2)
+    for name in library.names():
+        if _element(element) not in library.elements(name):
+            continue
+        # First s contraction: the 1s-like function
+        shells = library.basis(name, element, l=0)
+        plt.plot(r, 4.0*np.pi*r**2*np.abs(shells(r)[0])**2, ':', label=name, lw=2)
+    plt.xlabel("r (Bohr)", fontsize=16)
+    plt.ylabel("4πr²|ψ(r)|²", fontsize=16)
+    plt.title(f"Radial Distribution Functions ({element} s)", fontsize=18)
+    plt.legend()
+    plt.grid(True)
+    plt.tight_layout()
+    plt.savefig(filename)
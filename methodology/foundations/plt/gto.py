@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+# Contracted Gaussian-type functions evaluated in batches
+#
+# A set of M contractions is stored as padded (M, K) arrays of exponents and
+# coefficients (padding has coefficient 0), normalised with the closed-form
+# Gaussian overlaps and evaluated on a grid with one broadcasted operation,
+# chunk by chunk so the (M, K, points) temporary stays within a memory budget.
+#
+# Normalisation as normalize_radial in gauss_slater.py: ∫ |ψ(r)|^2 4π r^2 dr = 1
+# for the radial part r^l exp(-α r^2).
+import numpy as np
+from math import gamma
+
+# Bytes of the (M, K, points) temporary evaluated at once
+MEMORY = 2**26
+
+
+class Basis:
+    """Contractions packed in padded arrays
+
+    `contractions` is a list of (exponents, coefficients) pairs, `l` the
+    angular momentum of the radial part (one value or one per contraction).
+    Coefficients refer to normalised primitives, as in the basis set files.
+    """
+
+    def __init__(self, contractions, l=0, labels=None):
+        M = len(contractions)
+        K = max(len(alpha) for alpha, _ in contractions)
+        self.alpha = np.ones((M, K))
+        self.coef = np.zeros((M, K))
+        for i, (alpha, coef) in enumerate(contractions):
+            self.alpha[i, :len(alpha)] = alpha
+            self.coef[i, :len(coef)] = coef
+        self.l = np.broadcast_to(np.asarray(l), (M,)).copy()
+        self.labels = labels
+
+        # Primitive normalisation and contraction normalisation (analytic)
+        self.coef = self.coef*primitive_norm(self.alpha, self.l[:, None])
+        self.coef /= np.sqrt(self.self_overlap())[:, None]
+
+    def __len__(self):
+        return len(self.alpha)
+
+    def self_overlap(self):
+        """<φ|φ> of every contraction with the current coefficients"""
+        S = overlap(self.alpha[:, :, None], self.alpha[:, None, :],
+                    self.l[:, None, None])
+        return np.einsum('mi,mij,mj->m', self.coef, S, self.coef)
+
+    def __call__(self, r, memory=MEMORY):
+        """Values (M, *r.shape) of all the contractions at the radii r"""
+        r = np.asarray(r, dtype=float)
+        flat = r.ravel()
+        M, K = self.alpha.shape
+        out = np.empty((M, len(flat)))
+        step = max(1, memory//(8*M*K))
+        l = self.l[:, None]
+        for i in range(0, len(flat), step):
+            x = flat[i:i + step]
+            gauss = np.exp(-self.alpha[:, :, None]*(x*x)[None, None, :])
+            out[:, i:i + step] = np.einsum('mk,mkp->mp', self.coef, gauss)*x**l
+        return out.reshape((M,) + r.shape)
+
+    def on_points(self, points, centre=(0, 0, 0), memory=MEMORY):
+        """Radial values at 3-D points (..., 3) around `centre`"""
+        r = np.linalg.norm(np.asarray(points, dtype=float) - centre, axis=-1)
+        return self(r, memory)
+
+
+def overlap(a, b, l=0):
+    """∫ r^l e^{-a r^2} r^l e^{-b r^2} 4π r^2 dr (closed form, broadcasts)"""
+    p = a + b
+    g = np.vectorize(gamma)(np.asarray(l) + 1.5)
+    return 4*np.pi*g/(2*p**(np.asarray(l) + 1.5))
+
+
+def primitive_norm(alpha, l=0):
+    """Normalisation constant of r^l e^{-α r^2} ((2α/π)^{3/4} for l = 0)"""
+    return 1/np.sqrt(overlap(alpha, alpha, l))
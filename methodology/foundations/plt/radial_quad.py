@@ -0,0 +1,141 @@
+#!/usr/bin/python3
+# Radial quadratures for ∫_0^∞ f(r) r^2 dr
+#
+# Every grid returns (r, w) with ∫ f(r) r^2 dr ≈ Σ w_i f(r_i):
+#   laguerre      Gauss-Laguerre nodes scaled by `scale` (weights times e^x)
+#   becke         Gauss-Chebyshev (2nd kind) mapped by r = R (1+x)/(1-x)
+#   treutler      Gauss-Chebyshev (2nd kind) mapped by Treutler-Ahlrichs M4
+#   mura_knowles  midpoint rule mapped by r = -R α ln(1 - x^3)
+# `adaptive` doubles the number of points until two estimates agree.
+#
+# Usage: ./radial_quad.py     points vs normalisation error of the
+#                             contractions of gauss_slater.py
+import numpy as np
+from numpy.polynomial.laguerre import laggauss
+
+GRIDS = ['laguerre', 'becke', 'treutler', 'mura_knowles']
+
+# Beyond this e^x overflows the Gauss-Laguerre weights
+LAGUERRE_MAX = 180
+
+
+def laguerre(n, scale=1.0):
+    if n > LAGUERRE_MAX:
+        raise ValueError(f"Gauss-Laguerre limited to {LAGUERRE_MAX} points")
+    x, w = laggauss(n)
+    r = scale*x
+    return r, scale*w*np.exp(x)*r**2
+
+
+def _chebyshev2(n):
+    """Nodes and weights of ∫_{-1}^{1} g(x) dx (Gauss-Chebyshev 2nd kind)"""
+    t = np.arange(1, n + 1)*np.pi/(n + 1)
+    x = np.cos(t)
+    return x, np.pi/(n + 1)*np.sin(t)**2/np.sqrt(1 - x**2)
+
+
+def becke(n, scale=1.0):
+    x, w = _chebyshev2(n)
+    r = scale*(1 + x)/(1 - x)
+    return r, w*2*scale/(1 - x)**2*r**2
+
+
+def treutler(n, scale=1.0, alpha=0.6):
+    x, w = _chebyshev2(n)
+    log = np.log(2/(1 - x))
+    r = scale/np.log(2)*(1 + x)**alpha*log
+    dr = scale/np.log(2)*(alpha*(1 + x)**(alpha - 1)*log + (1 + x)**alpha/(1 - x))
+    return r, w*dr*r**2
+
+
+def mura_knowles(n, scale=1.0, alpha=5.0):
+    x = (np.arange(n) + 0.5)/n
+    r = -scale*alpha*np.log(1 - x**3)
+    return r, scale*alpha*3*x**2/(1 - x**3)/n*r**2
+
+
+def grid(kind, n, scale=1.0):
+    """(r, w) of one of the GRIDS with n points"""
+    return globals()[kind](n, scale)
+
+
+def integrate(f, kind='treutler', n=50, scale=1.0):
+    """∫_0^∞ f(r) r^2 dr (f vectorized, may return (..., n) values)"""
+    r, w = grid(kind, n, scale)
+    return f(r) @ w
+
+
+def adaptive(f, tol=1e-10, kind='treutler', n=16, nmax=4096, scale=1.0):
+    """∫_0^∞ f(r) r^2 dr to `tol` (relative): value and the points used"""
+    if kind == 'laguerre':
+        nmax = min(nmax, LAGUERRE_MAX)
+    value = integrate(f, kind, n, scale)
+    while 2*n <= nmax:
+        n *= 2
+        new = integrate(f, kind, n, scale)
+        if np.all(np.abs(new - value) <= tol*np.maximum(np.abs(new), 1e-300)):
+            return new, n
+        value = new
+    return value, n
+
+
+def rectangle(n, rmax=8.0):
+    """The uniform rule used so far: linspace(0, rmax, n), weights dr r^2"""
+    r = np.linspace(0, rmax, n)
+    return r, (r[1] - r[0])*r**2
+
+
+def benchmark(basis, points=(10, 20, 40, 80, 160, 320, 640), scale=1.0):
+    """|4π ∫ ψ^2 r^2 dr - 1| of every contraction for every grid and size
+
+    {grid: array (len(points), len(basis))}; the basis is normalised
+    analytically, so the exact value is 1.
+    """
+    errors = {}
+    for kind in GRIDS + ['rectangle']:
+        rows = []
+        for n in points:
+            if kind == 'laguerre' and n > LAGUERRE_MAX:
+                rows.append(np.full(len(basis), np.nan))
+                continue
+            r, w = rectangle(n) if kind == 'rectangle' else grid(kind, n, scale)
+            rows.append(np.abs(4*np.pi*(basis(r)**2 @ w) - 1))
+        errors[kind] = np.array(rows)
+    return errors
+
+
+if __name__ == "__main__":
+    import matplotlib.pyplot as plt
+    from gto import Basis
+
+    # The contractions of gauss_slater.py
+    basis = Basis([
+        ([0.270950], [1.0]),
+        ([0.151623, 0.851819], [0.678914, 0.430129]),
+        ([2.22766, 0.405771, 0.109818], [0.154329, 0.535328, 0.444635]),
+        ([18.73113696, 2.825394365, 0.6401216923, 0.1612777588],
+         [0.03349460434, 0.2347269535, 0.8137573261, 1.0]),
+    ], labels=["STO-1G", "STO-2G", "STO-3G", "6-31G"])
+    points = (10, 20, 40, 80, 160, 320, 640)
+    errors = benchmark(basis, points)
+
+    print(f"{'grid':<14}{'basis':<8}" + "".join(f"{n:>10}" for n in points))
+    for kind, table in errors.items():
+        for label, column in zip(basis.labels, table.T):
+            print(f"{kind:<14}{label:<8}" + "".join(f"{e:>10.1e}" for e in column))
+    print("points for a 1e-10 normalisation (adaptive):")
+    for kind in GRIDS:
+        _, n = adaptive(lambda r: 4*np.pi*basis(r)**2, 1e-10, kind)
+        print(f"  {kind:<14}{n}")
+
+    fig, axes = plt.subplots(1, len(basis), figsize=(5*len(basis), 4), sharey=True)
+    for ax, label, i in zip(axes, basis.labels, range(len(basis))):
+        for kind, table in errors.items():
+            ax.loglog(points, np.maximum(table[:, i], 1e-17), 'o-', label=kind)
+        ax.set_title(label, fontsize=14)
+        ax.set_xlabel("radial points", fontsize=12)
+        ax.grid(True, alpha=0.3)
+    axes[0].set_ylabel("normalisation error", fontsize=12)
+    axes[0].legend()
+    fig.tight_layout()
+    fig.savefig("radial_quadrature_benchmark.pdf")
@@ -0,0 +1,133 @@
+#!/usr/bin/python3
+# Least-squares STO-nG fits: n Gaussians r^l e^{-α r^2} approximating the
+# normalised Slater function r^l e^{-ζ r}.
+#
+# Minimising ||S - G||^2 over normalised contractions is maximising <S|G>.
+# For fixed exponents the best coefficients are closed form (c = S^-1 s, with
+# S the primitive overlaps and s the Slater-Gaussian overlaps), so only the
+# exponents are optimised, in log scale, with analytic gradients:
+#   ∫ r^m e^{-ζr - αr^2} dr = m! (2α)^{-(m+1)/2} e^{ζ^2/8α} D_{-m-1}(ζ/√(2α))
+# (D the parabolic cylinder function) and d/dα of it is minus the m + 2 one.
+#
+# Usage: ./sto_fit.py --n 1 2 3 4 5 6 --zeta 1.0 1.24 --l 0 1 [--workers 4]
+import os
+import json
+import time
+import argparse
+import numpy as np
+from math import factorial
+from concurrent.futures import ProcessPoolExecutor
+from scipy.optimize import minimize
+from scipy.special import pbdv
+from gto import primitive_norm
+
+# Exponents searched in [LOW, HIGH]·ζ^2 (keeps the integrals finite)
+LOW, HIGH = 1e-3, 1e5
+
+
+def slater_gaussian(m, alpha, zeta):
+    """∫_0^∞ r^m e^{-ζ r - α r^2} dr for an array of α"""
+    x = zeta/np.sqrt(2*alpha)
+    d, _ = pbdv(-m - 1.0, x)
+    return factorial(m)*(2*alpha)**(-(m + 1)/2)*np.exp(x*x/4)*d
+
+
+def slater_norm(zeta, l=0):
+    """Normalisation constant of r^l e^{-ζ r}"""
+    return np.sqrt((2*zeta)**(2*l + 3)/(4*np.pi*factorial(2*l + 2)))
+
+
+def objective(t, zeta, l=0):
+    """1 - <S|G>^2 of the best contraction with exponents e^t, its gradient and c"""
+    alpha = np.exp(t)
+    m = 2*l + 2
+    k = l + 1.5
+
+    # Normalised primitive overlaps and their derivatives (d S_ij / d α_i)
+    a, b = alpha[:, None], alpha[None, :]
+    S = (2*np.sqrt(a*b)/(a + b))**k
+    dS = S*k*(1/(2*a) - 1/(a + b))
+
+    # Slater-Gaussian overlaps and derivatives
+    norm = 4*np.pi*slater_norm(zeta, l)*primitive_norm(alpha, l)
+    s = norm*slater_gaussian(m, alpha, zeta)
+    ds = norm*(k/(2*alpha)*slater_gaussian(m, alpha, zeta)
+               - slater_gaussian(m + 2, alpha, zeta))
+
+    c = np.linalg.solve(S, s)
+    value = 1 - s @ c
+    # d(s^T S^-1 s) = 2 c^T ds - c^T dS c  (diagonal of S is constant)
+    np.fill_diagonal(dS, 0)
+    grad = -(2*c*ds - 2*c*(dS @ c))
+    return value, grad*alpha, c
+
+
+def fit(n, zeta=1.0, l=0, starts=4):
+    """Exponents, coefficients (normalised primitives) and 1 - <S|G>^2 of STO-nG"""
+    bounds = [(np.log(LOW*zeta**2), np.log(HIGH*zeta**2))]*n
+    best = None
+    # Even-tempered starting points of different spreads
+    for ratio in np.linspace(2.5, 6, starts):
+        t0 = np.log(0.27*zeta**2) + np.log(ratio)*(np.arange(n) - (n - 1)/2)
+        t0 = np.clip(t0, bounds[0][0], bounds[0][1])
+        result = minimize(lambda t: objective(t, zeta, l)[:2], t0, jac=True,
+                          method='L-BFGS-B', bounds=bounds,
+                          options={'ftol': 1e-15, 'gtol': 1e-12, 'maxiter': 2000})
+        if best is None or result.fun < best.fun:
+            best = result
+    alpha = np.exp(best.x)
+    error, _, c = objective(best.x, zeta, l)
+    order = np.argsort(alpha)[::-1]
+    # Normalised contraction: c^T S c = s^T c = <S|G>^2
+    c = c/np.sqrt(1 - error)/np.sign(np.sum(c))
+    return alpha[order], c[order], error
+
+
+def fit_task(task):
+    """(n, ζ, l) -> fit record with the time it took"""
+    n, zeta, l = task
+    start = time.perf_counter()
+    alpha, coef, error = fit(n, zeta, l)
+    return {'n': n, 'zeta': zeta, 'l': l, 'exponents': alpha.tolist(),
+            'coefficients': coef.tolist(), 'error': float(error),
+            'time': time.perf_counter() - start}
+
+
+def sweep(ns, zetas, ls=(0,), workers=None, cache=None):
+    """Fits of every (n, ζ, l), on a process pool, reusing the cached ones"""
+    tasks = [(int(n), float(zeta), int(l)) for l in ls for zeta in zetas for n in ns]
+    filename = os.path.join(cache, 'sto_fits.json') if cache else None
+    done = {}
+    if filename and os.path.exists(filename):
+        with open(filename) as f:
+            done = json.load(f)
+    todo = [task for task in tasks if json.dumps(task) not in done]
+    if todo:
+        if workers == 1 or len(todo) == 1:
+            results = list(map(fit_task, todo))
+        else:
+            with ProcessPoolExecutor(workers) as pool:
+                results = list(pool.map(fit_task, todo))
+        done.update((json.dumps(task), record) for task, record in zip(todo, results))
+        if filename:
+            os.makedirs(cache, exist_ok=True)
+            with open(filename, 'w') as f:
+                json.dump(done, f)
+    return [done[json.dumps(task)] for task in tasks]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n', type=int, nargs='+', default=[1, 2, 3, 4, 5, 6])
+    parser.add_argument('--zeta', type=float, nargs='+', default=[1.0])
+    parser.add_argument('--l', type=int, nargs='+', default=[0])
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--cache', default='.sto_cache')
+    args = parser.parse_args()
+
+    print(f"{'l':>2}{'zeta':>8}{'n':>3}{'1-<S|G>^2':>14}{'time [ms]':>11}  exponents / coefficients")
+    for r in sweep(args.n, args.zeta, args.l, args.workers, args.cache):
+        print(f"{r['l']:>2}{r['zeta']:>8.3f}{r['n']:>3}{r['error']:>14.3e}"
+              f"{1000*r['time']:>11.1f}  "
+              + " ".join(f"{a:.6g}" for a in r['exponents']) + " / "
+              + " ".join(f"{c:.6f}" for c in r['coefficients']))
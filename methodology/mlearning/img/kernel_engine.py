@@ -0,0 +1,217 @@
+#!/usr/bin/python3
+# Kernels of kernels.py for large training sets
+#
+# gram() fills linear/poly/RBF/sigmoid Gram matrices block by block (rows of
+# at most `memory` bytes, into any array, e.g. a np.memmap). GramSVC trains
+# svm.SVC on such a matrix (on disk with `scratch`, the n×n matrix is still
+# O(n²)) and evaluates decision_function in blocks against the support
+# vectors only. nystroem_svm and fourier_svm approximate the
+# kernel with explicit features and a linear SVM, so their cost grows
+# linearly with the number of rows. All of them are estimators, usable in
+# plot_training_data_with_decision_boundary.
+#
+# decision_mesh() evaluates decision_function once on a shared mesh, chunk by
+# chunk in a thread pool (libsvm and numpy release the GIL, and the mesh
+# is not copied to other processes); the predicted class is its sign.
+#
+# Usage: ./kernel_engine.py [--rows 1000 4000 16000] [--kernels rbf poly]
+import time
+import argparse
+import tempfile
+import tracemalloc
+from contextlib import ExitStack
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from sklearn import svm
+from sklearn.base import BaseEstimator, ClassifierMixin
+from sklearn.kernel_approximation import Nystroem, RBFSampler
+from sklearn.pipeline import make_pipeline
+
+# Bytes of a Gram block computed at once
+MEMORY = 2**27
+# Mesh points per decision_function call
+CHUNK = 16384
+
+
+def kernel_block(A, B, kernel='rbf', gamma=2.0, degree=3, coef0=0.0, B_sq=None):
+    """K(A, B) with the definitions of svm.SVC"""
+    K = A @ B.T
+    if kernel == 'linear':
+        return K
+    if kernel == 'rbf':
+        B_sq = np.einsum('ij,ij->i', B, B) if B_sq is None else B_sq
+        K *= -2
+        K += np.einsum('ij,ij->i', A, A)[:, None]
+        K += B_sq[None, :]
+        np.maximum(K, 0, out=K)
+        K *= -gamma
+        return np.exp(K, out=K)
+    K *= gamma
+    K += coef0
+    if kernel == 'poly':
+        if degree != int(degree) or degree < 1:
+            return np.power(K, degree, out=K)
+        # Integer degree: products are much faster than the generic power
+        P = K.copy()
+        for _ in range(int(degree) - 1):
+            P *= K
+        return P
+    if kernel == 'sigmoid':
+        return np.tanh(K, out=K)
+    raise ValueError(f"unknown kernel {kernel!r}")
+
+
+def row_blocks(nrows, ncols, memory=MEMORY):
+    """Slices of rows whose (rows, ncols) float64 block fits in `memory`"""
+    step = max(1, memory//(8*max(ncols, 1)))
+    return [slice(i, min(i + step, nrows)) for i in range(0, nrows, step)]
+
+
+def gram(X, Y=None, kernel='rbf', gamma=2.0, degree=3, coef0=0.0,
+         memory=MEMORY, out=None):
+    """Gram matrix K(X, Y) computed block by block into `out`"""
+    X = np.asarray(X, dtype=float)
+    Y = X if Y is None else np.asarray(Y, dtype=float)
+    out = np.empty((len(X), len(Y))) if out is None else out
+    Y_sq = np.einsum('ij,ij->i', Y, Y)
+    for rows in row_blocks(len(X), len(Y), memory):
+        out[rows] = kernel_block(X[rows], Y, kernel, gamma, degree, coef0, Y_sq)
+    return out
+
+
+class GramSVC(ClassifierMixin, BaseEstimator):
+    """Binary svm.SVC trained on a blocked Gram matrix
+
+    fit() needs the whole n×n training matrix (8n² bytes): `memory` only
+    bounds the blocks it is computed in. With a `scratch` directory the
+    matrix is a np.memmap of a temporary file there, which libsvm reads
+    without copying, so it stays out of the process memory. Past a few 10⁴
+    rows use nystroem_svm or fourier_svm, whose memory is linear in n.
+    """
+
+    def __init__(self, kernel='rbf', gamma=2.0, degree=3, coef0=0.0, C=1.0,
+                 memory=MEMORY, scratch=None):
+        self.kernel = kernel
+        self.gamma = gamma
+        self.degree = degree
+        self.coef0 = coef0
+        self.C = C
+        self.memory = memory
+        self.scratch = scratch
+
+    def _params(self):
+        return dict(kernel=self.kernel, gamma=self.gamma, degree=self.degree,
+                    coef0=self.coef0, memory=self.memory)
+
+    def fit(self, X, y):
+        X = np.asarray(X, dtype=float)
+        with ExitStack() as stack:
+            out = None
+            if self.scratch is not None:
+                f = stack.enter_context(tempfile.TemporaryFile(dir=self.scratch))
+                out = np.memmap(f, dtype=float, mode='w+', shape=(len(X), len(X)))
+            K = gram(X, out=out, **self._params())
+            clf = svm.SVC(kernel='precomputed', C=self.C).fit(K, y)
+            del K, out
+        self.classes_ = clf.classes_
+        self.support_ = clf.support_
+        self.support_vectors_ = X[clf.support_]
+        self.dual_coef_ = clf.dual_coef_[0]
+        self.intercept_ = clf.intercept_[0]
+        return self
+
+    def decision_function(self, X):
+        X = np.asarray(X, dtype=float)
+        out = np.empty(len(X))
+        sv = self.support_vectors_
+        sv_sq = np.einsum('ij,ij->i', sv, sv)
+        for rows in row_blocks(len(X), len(sv), self.memory):
+            K = kernel_block(X[rows], sv, self.kernel, self.gamma, self.degree,
+                             self.coef0, sv_sq)
+            out[rows] = K @ self.dual_coef_ + self.intercept_
+        return out
+
+    def predict(self, X):
+        return self.classes_[(self.decision_function(X) > 0).astype(int)]
+
+
+def nystroem_svm(kernel='rbf', n_components=300, gamma=2.0, degree=3, coef0=0.0,
+                 C=1.0, seed=0):
+    """Nyström features of the kernel followed by a linear SVM"""
+    return make_pipeline(
+        Nystroem(kernel=kernel, gamma=gamma, degree=degree, coef0=coef0,
+                 n_components=n_components, random_state=seed),
+        svm.LinearSVC(C=C))
+
+
+def fourier_svm(n_components=300, gamma=2.0, C=1.0, seed=0):
+    """Random Fourier features of the RBF kernel followed by a linear SVM"""
+    return make_pipeline(RBFSampler(gamma=gamma, n_components=n_components,
+                                    random_state=seed),
+                         svm.LinearSVC(C=C))
+
+
+def decision_mesh(clf, xx, yy, chunk=CHUNK, workers=None):
+    """decision_function of a binary classifier on the mesh (xx, yy)
+
+    The predicted class of every point is clf.classes_[values > 0].
+    """
+    points = np.column_stack([xx.ravel(), yy.ravel()])
+    chunks = [points[i:i + chunk] for i in range(0, len(points), chunk)]
+    with ThreadPoolExecutor(workers) as pool:
+        values = np.concatenate(list(pool.map(clf.decision_function, chunks)))
+    return values.reshape(xx.shape)
+
+
+def xor_data(n, seed=0):
+    """The XOR problem of kernels.py with n samples"""
+    rng = np.random.default_rng(seed)
+    X = rng.standard_normal((n, 2))
+    return X, np.logical_xor(X[:, 0] > 0, X[:, 1] > 0)
+
+
+def benchmark(rows, kernels=('linear', 'poly', 'rbf', 'sigmoid'), n_test=2000,
+              n_components=300):
+    """Training time, peak memory and test accuracy of exact and approximate SVMs
+
+    Memory is the peak traced by tracemalloc: libsvm's own kernel cache (up to
+    200 MB for svc) and the page cache of the 'gram-disk' matrix are not
+    included.
+    """
+    X_test, y_test = xor_data(n_test, seed=1)
+    results = []
+    for n in rows:
+        X, y = xor_data(n)
+        for kernel in kernels:
+            models = {'svc': svm.SVC(kernel=kernel, gamma=2.0),
+                      'gram': GramSVC(kernel=kernel),
+                      'gram-disk': GramSVC(kernel=kernel, scratch=tempfile.gettempdir()),
+                      'nystroem': nystroem_svm(kernel, n_components)}
+            if kernel == 'rbf':
+                models['fourier'] = fourier_svm(n_components)
+            for method, model in models.items():
+                tracemalloc.start()
+                start = time.perf_counter()
+                model.fit(X, y)
+                elapsed = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                results.append({'rows': n, 'kernel': kernel, 'method': method,
+                                'time': elapsed, 'memory': peak/2**20,
+                                'accuracy': model.score(X_test, y_test)})
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 4000])
+    parser.add_argument('--kernels', nargs='+',
+                        default=['linear', 'poly', 'rbf', 'sigmoid'])
+    parser.add_argument('--components', type=int, default=300)
+    args = parser.parse_args()
+
+    print(f"{'rows':>7} {'kernel':<8}{'method':<11}{'fit [s]':>9}"
+          f"{'peak [MB]':>11}{'accuracy':>10}")
+    for r in benchmark(args.rows, args.kernels, n_components=args.components):
+        print(f"{r['rows']:>7} {r['kernel']:<8}{r['method']:<11}{r['time']:>9.3f}"
+              f"{r['memory']:>11.1f}{r['accuracy']:>10.3f}")
@@ -2,10 +2,14 @@
 # Little modifications from the documentation code in
 # https://scikit-learn.org/stable/auto_examples/svm/plot_svm_kernels.html#sphx-glr-auto-examples-svm-plot-svm-kernels-py
 #
+# Usage: ./kernels.py [resolution]
+#        points per side of the decision mesh, 100 (as DecisionBoundaryDisplay)
+#        by default
+import sys
 import matplotlib.pyplot as plt
 import numpy as np
 from sklearn import svm
-from sklearn.inspection import DecisionBoundaryDisplay
+from kernel_engine import decision_mesh
 
 X = np.array(
     [
@@ -31,33 +35,33 @@ X = np.array(
 y = np.array([0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 1, 1, 1, 1, 1])
 
 def plot_training_data_with_decision_boundary(
-    kernel, ax=None, long_title=True, support_vectors=True
+    kernel, ax=None, long_title=True, support_vectors=True, clf=None, mesh=None
     ):
-    # Train the SVC
-    clf = svm.SVC(kernel=kernel, gamma=2).fit(X, y)
+    # Train the SVC (or any classifier given, e.g. from kernel_engine)
+    if clf is None:
+        clf = svm.SVC(kernel=kernel, gamma=2)
+    clf = clf.fit(X, y)
 
     # Settings for plotting
     x_min, x_max, y_min, y_max = -3, 3, -3, 3
     ax.set(xlim=(x_min, x_max), ylim=(y_min, y_max))
 
-    # Plot decision boundary and margins
-    common_params = {"estimator": clf, "X": X, "ax": ax}
-    DecisionBoundaryDisplay.from_estimator(
-        **common_params,
-        response_method="predict",
-        plot_method="pcolormesh",
-        alpha=0.3,
-    )
-    DecisionBoundaryDisplay.from_estimator(
-        **common_params,
-        response_method="decision_function",
-        plot_method="contour",
+    # Plot decision boundary and margins: decision_function evaluated once
+    # on the mesh shared by every panel, the class is its sign
+    xx_mesh, yy_mesh = (xx, yy) if mesh is None else mesh
+    values = decision_mesh(clf, xx_mesh, yy_mesh)
+    ax.pcolormesh(xx_mesh, yy_mesh, values > 0, alpha=0.3, shading="auto",
+                  rasterized=True)
+    ax.contour(
+        xx_mesh,
+        yy_mesh,
+        values,
         levels=[-1, 0, 1],
         colors=["k", "k", "k"],
         linestyles=["--", "-", "--"],
     )
 
-    if support_vectors:
+    if support_vectors and hasattr(clf, "support_vectors_"):
         # Plot bigger circles around samples that serve as support vectors
         ax.scatter(
             clf.support_vectors_[:, 0],
@@ -72,7 +76,8 @@ def plot_training_data_with_decision_boundary(
     ax.legend(*scatter.legend_elements(), loc="upper right", title="Classes")
     ax.set_title(kernel)
 
-xx, yy = np.meshgrid(np.linspace(-3, 3, 500), np.linspace(-3, 3, 500))
+resolution = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+xx, yy = np.meshgrid(np.linspace(-3, 3, resolution), np.linspace(-3, 3, resolution))
 np.random.seed(0)
 X = np.random.randn(300, 2)
 y = np.logical_xor(X[:, 0] > 0, X[:, 1] > 0)
@@ -0,0 +1,165 @@
+#!/usr/bin/python3
+# Bond graphs from atomic coordinates, kept sparse
+#
+# Two atoms are bonded when their distance is below the sum of their covalent
+# radii plus a tolerance. Candidate pairs come from a KD-tree (cKDTree
+# query_pairs) with the largest possible cutoff, so the cost grows with the
+# number of atoms instead of its square. The adjacency is kept as CSR
+# arrays (indptr, indices) and the topology (chain, tree, ring, cage, ...)
+# is computed on them; networkx graphs are only built on request.
+#
+# Usage: ./bond_graph.py molecules.xyz     topology of every frame
+import sys
+import numpy as np
+from scipy.spatial import cKDTree
+from scipy.sparse import csr_array
+from scipy.sparse.csgraph import connected_components
+
+# Covalent radii [Å] (Cordero et al. 2008)
+COVALENT = dict(zip(
+    "H He Li Be B C N O F Ne Na Mg Al Si P S Cl Ar K Ca Sc Ti V Cr Mn Fe Co Ni "
+    "Cu Zn Ga Ge As Se Br Kr Rb Sr Y Zr Nb Mo Tc Ru Rh Pd Ag Cd In Sn Sb Te I "
+    "Xe".split(),
+    [0.31, 0.28, 1.28, 0.96, 0.84, 0.76, 0.71, 0.66, 0.57, 0.58, 1.66, 1.41,
+     1.21, 1.11, 1.07, 1.05, 1.02, 1.06, 2.03, 1.76, 1.70, 1.60, 1.53, 1.39,
+     1.39, 1.32, 1.26, 1.24, 1.32, 1.22, 1.22, 1.20, 1.19, 1.20, 1.20, 1.16,
+     2.20, 1.95, 1.90, 1.75, 1.64, 1.54, 1.47, 1.46, 1.42, 1.39, 1.45, 1.44,
+     1.42, 1.39, 1.39, 1.38, 1.39, 1.40]))
+BOHR = 0.529177210903  # Å
+
+
+class BondGraph:
+    """Symmetric CSR adjacency of a molecule
+
+    `pairs` holds every bond once (i < j); `indptr`/`indices` the neighbours
+    of every atom.
+    """
+
+    def __init__(self, pairs, natoms, symbols=None, lengths=None):
+        pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+        self.pairs = pairs
+        self.natoms = natoms
+        self.symbols = symbols
+        self.lengths = lengths
+        rows = np.concatenate([pairs[:, 0], pairs[:, 1]])
+        cols = np.concatenate([pairs[:, 1], pairs[:, 0]])
+        order = np.lexsort((cols, rows))
+        self.indices = cols[order]
+        self.indptr = np.zeros(natoms + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=natoms), out=self.indptr[1:])
+
+    @classmethod
+    def from_coordinates(cls, symbols, coords, tolerance=0.4, units='angstrom'):
+        """Bonds with d < r_i + r_j + tolerance [Å]"""
+        coords = np.asarray(coords, dtype=float)
+        if units == 'bohr':
+            coords = coords*BOHR
+        radii = np.array([COVALENT.get(s.capitalize(), 1.5) for s in symbols])
+        if len(coords) < 2:
+            return cls(np.empty((0, 2)), len(coords), list(symbols), np.empty(0))
+        pairs = cKDTree(coords).query_pairs(2*radii.max() + tolerance,
+                                            output_type='ndarray')
+        d = np.linalg.norm(coords[pairs[:, 0]] - coords[pairs[:, 1]], axis=1)
+        bonded = d < radii[pairs[:, 0]] + radii[pairs[:, 1]] + tolerance
+        return cls(pairs[bonded], len(coords), list(symbols), d[bonded])
+
+    @classmethod
+    def from_edges(cls, nodes, edges):
+        """Graph of labelled nodes and (label, label) edges (as in graphs.py)"""
+        index = {node: i for i, node in enumerate(nodes)}
+        pairs = np.sort([[index[a], index[b]] for a, b in edges], axis=1)
+        return cls(pairs, len(index), list(nodes))
+
+    def csr(self):
+        """scipy.sparse CSR adjacency"""
+        data = np.ones(len(self.indices), dtype=np.int8)
+        return csr_array((data, self.indices, self.indptr),
+                         shape=(self.natoms, self.natoms))
+
+    def degree(self):
+        return np.diff(self.indptr)
+
+    def neighbours(self, i):
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def components(self):
+        """Number of fragments and the fragment of every atom"""
+        return connected_components(self.csr(), directed=False)
+
+    def nrings(self):
+        """Independent rings (cyclomatic number E - V + C)"""
+        ncomp, _ = self.components()
+        return len(self.pairs) - self.natoms + ncomp
+
+    def cyclic(self):
+        """Atoms of the cyclic core (what is left after pruning the leaves)"""
+        degree = self.degree().copy()
+        alive = np.ones(self.natoms, dtype=bool)
+        leaves = np.flatnonzero(degree <= 1)
+        while len(leaves):
+            alive[leaves] = False
+            # Every neighbour loses one bond per removed leaf
+            hit = np.concatenate([self.neighbours(i) for i in leaves])
+            np.subtract.at(degree, hit, 1)
+            degree[leaves] = 0
+            leaves = np.flatnonzero(alive & (degree <= 1))
+        return alive
+
+    def topology(self):
+        """'isolated', 'chain', 'tree', 'ring', 'cage' or 'polycyclic'"""
+        if len(self.pairs) == 0:
+            return 'isolated'
+        rings = self.nrings()
+        if rings == 0:
+            return 'chain' if self.degree().max() <= 2 else 'tree'
+        if rings == 1:
+            return 'ring'
+        core = self.cyclic()
+        # Every core atom in three rings or more: cage (the pyramid projection);
+        # only the bonds within the core count, not those to H or side chains
+        inner = self.pairs[core[self.pairs[:, 0]] & core[self.pairs[:, 1]]]
+        degree = np.bincount(inner.ravel(), minlength=self.natoms)
+        return 'cage' if np.all(degree[core] >= 3) else 'polycyclic'
+
+    def to_networkx(self):
+        """networkx.Graph with the symbols (and bond lengths) as attributes"""
+        import networkx as nx
+        G = nx.Graph()
+        G.add_nodes_from(range(self.natoms))
+        if self.symbols is not None:
+            nx.set_node_attributes(G, dict(enumerate(self.symbols)), 'symbol')
+        if self.lengths is not None:
+            G.add_weighted_edges_from(
+                zip(self.pairs[:, 0].tolist(), self.pairs[:, 1].tolist(),
+                    self.lengths.tolist()), weight='length')
+        else:
+            G.add_edges_from(self.pairs.tolist())
+        return G
+
+
+def read_xyz(path):
+    """(symbols, coordinates) of every frame of a (multi-frame) xyz file"""
+    with open(path) as f:
+        lines = f.read().splitlines()
+    frames, i = [], 0
+    while i < len(lines) and lines[i].strip():
+        n = int(lines[i])
+        atoms = [line.split() for line in lines[i + 2:i + 2 + n]]
+        frames.append(([a[0] for a in atoms],
+                       np.array([a[1:4] for a in atoms], dtype=float)))
+        i += n + 2
+    return frames
+
+
+def build_many(frames, tolerance=0.4, units='angstrom'):
+    """BondGraph of every (symbols, coordinates) frame"""
+    return [BondGraph.from_coordinates(s, c, tolerance, units) for s, c in frames]
+
+
+if __name__ == "__main__":
+    from collections import Counter
+    graphs = build_many(read_xyz(sys.argv[1]))
+    print(f"{len(graphs)} molecules, {sum(g.natoms for g in graphs)} atoms, "
+          f"{sum(len(g.pairs) for g in graphs)} bonds")
+    for topology, count in Counter(g.topology() for g in graphs).most_common():
+        print(f"{topology:<12}{count:>8}")
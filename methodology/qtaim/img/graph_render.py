@@ -0,0 +1,139 @@
+#!/usr/bin/python3
+# Batch rendering of graphs on one reused figure
+#
+# The figure, the node scatter, the edge LineCollection and a pool of label
+# texts are created once; every graph only updates their data (offsets,
+# segments, texts) before the page is saved, into a multi-page PdfPages file
+# or into separate files. Memory does not grow with the number of graphs
+# and everything is closed on exit.
+#
+# The default style is the one of graphs.py (white circles, thick black
+# borders and edges, bold labels).
+#
+# Usage: ./graph_render.py molecules.xyz molecules.pdf   one page per frame
+import sys
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+from matplotlib.backends.backend_pdf import PdfPages
+
+STYLE = dict(node_size=9000, node_color='white', edgecolors='black',
+             font_size=36, font_weight='bold', edge_color='black',
+             width=5, linewidths=5)
+# Smaller nodes for whole molecules
+MOLECULE_STYLE = dict(STYLE, node_size=300, font_size=8, width=2, linewidths=1.5)
+
+
+class GraphRenderer:
+    """One figure whose artists are updated for every graph
+
+    With `pdf` every page goes to that multi-page file, otherwise save()
+    needs a filename. Use as a context manager (or call close()).
+    """
+
+    def __init__(self, figsize=(8, 8), style=None, pdf=None, margin=0.05,
+                 rect=(0, 0, 1, 1)):
+        self.style = dict(STYLE, **(style or {}))
+        self.margin = margin
+        # Whole-figure axes by default, as nx.draw creates them (the title is
+        # then off the page; leave room with a smaller `rect`)
+        self.fig = plt.figure(figsize=figsize)
+        self.ax = self.fig.add_axes(rect)
+        self.ax.set_axis_off()
+        s = self.style
+        self.edges = self.ax.add_collection(LineCollection(
+            [], colors=s['edge_color'], linewidths=s['width'], zorder=1))
+        self.nodes = self.ax.scatter([], [], s=s['node_size'], c=s['node_color'],
+                                     edgecolors=s['edgecolors'],
+                                     linewidths=s['linewidths'], zorder=2)
+        self.labels = []
+        self.title = self.ax.set_title("", fontsize=16, fontweight='bold', pad=20)
+        self.pdf = PdfPages(pdf) if pdf else None
+
+    def _label(self, i):
+        # Texts are created once and reused by the next graphs
+        while len(self.labels) <= i:
+            self.labels.append(self.ax.text(0, 0, "", ha='center', va='center',
+                                            fontsize=self.style['font_size'],
+                                            fontweight=self.style['font_weight'],
+                                            zorder=3))
+        return self.labels[i]
+
+    def draw(self, positions, edges, title=""):
+        """Update the artists: positions {node: (x, y)}, edges [(node, node)]
+
+        `positions` may also be (labels, xy array) and `edges` an (E, 2)
+        array of node indices.
+        """
+        if isinstance(positions, dict):
+            labels = list(positions)
+            xy = np.array([positions[n] for n in labels], dtype=float)
+            index = {n: i for i, n in enumerate(labels)}
+            pairs = np.array([[index[a], index[b]] for a, b in edges],
+                             dtype=np.int64).reshape(-1, 2)
+        else:
+            labels, xy = positions
+            xy = np.asarray(xy, dtype=float)
+            pairs = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+
+        self.nodes.set_offsets(xy)
+        self.edges.set_segments(xy[pairs])
+        for i, (label, (x, y)) in enumerate(zip(labels, xy)):
+            text = self._label(i)
+            text.set_text(str(label))
+            text.set_position((x, y))
+            text.set_visible(True)
+        for text in self.labels[len(labels):]:
+            text.set_visible(False)
+        self.title.set_text(title)
+
+        # Same view as nx.draw: edges padded by `margin`, then the axes margins
+        low, high = xy.min(axis=0), xy.max(axis=0)
+        width = np.where(high > low, high - low, 1)
+        pad = width*(self.margin + np.array(self.ax.margins())*(1 + 2*self.margin))
+        self.ax.set_xlim(low[0] - pad[0], high[0] + pad[0])
+        self.ax.set_ylim(low[1] - pad[1], high[1] + pad[1])
+
+    def save(self, filename=None):
+        """Next page of the PdfPages file, or a separate file"""
+        if filename is None:
+            self.pdf.savefig(self.fig)
+        else:
+            self.fig.savefig(filename)
+
+    def render(self, positions, edges, title="", filename=None):
+        self.draw(positions, edges, title)
+        self.save(filename)
+
+    def close(self):
+        if self.pdf is not None:
+            self.pdf.close()
+            self.pdf = None
+        plt.close(self.fig)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def projection(coords):
+    """2-D coordinates of a molecule on its two main axes"""
+    centred = coords - coords.mean(axis=0)
+    if len(coords) < 2:
+        return centred[:, :2]
+    _, _, vt = np.linalg.svd(centred, full_matrices=False)
+    return centred @ vt[:2].T
+
+
+if __name__ == "__main__":
+    from bond_graph import read_xyz, BondGraph
+    frames = read_xyz(sys.argv[1])
+    with GraphRenderer(style=MOLECULE_STYLE, pdf=sys.argv[2],
+                       rect=(0.05, 0.05, 0.9, 0.85)) as renderer:
+        for k, (symbols, coords) in enumerate(frames):
+            graph = BondGraph.from_coordinates(symbols, coords)
+            renderer.render((symbols, projection(coords)), graph.pairs,
+                            f"{k}: {len(symbols)} atoms, {graph.topology()}")
+    print(f"{len(frames)} pages written to {sys.argv[2]}")
@@ -1,6 +1,6 @@
 #!/usr/bin/python3
-import matplotlib.pyplot as plt
 import networkx as nx
+from graph_render import GraphRenderer
 
 # Create a graph
 G = nx.Graph()
@@ -19,23 +19,8 @@ G.add_nodes_from(positions.keys())
 edges = [("A", "B"), ("A", "C"), ("B", "C"), ("B", "D"), ("D", "E")]
 G.add_edges_from(edges)
 
-# Plot the graph
-plt.figure(figsize=(8, 8))
-
-# Draw nodes with a black border (circle), white background, and black edges
-nx.draw(
-    G, positions,
-    with_labels=True,
-    node_size=9000,      # Size of circles
-    node_color='white',
-    edgecolors='black',
-    font_size=36,
-    font_weight='bold',
-    edge_color='black',
-    width=5,             # Width of edges
-    linewidths=5,        # Width of node borders
-)
-
-plt.savefig("abcde_charges.pdf")
+# Plot the graph: white circles with a black border, black edges (the
+# style of graph_render.py)
+with GraphRenderer(figsize=(8, 8)) as renderer:
+    renderer.render(positions, G.edges(), filename="abcde_charges.pdf")
 # plt.show()
-
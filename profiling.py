@@ -0,0 +1,356 @@
+#!/usr/bin/python3
+# Phase-level profile of one figure or analysis script
+#
+# The script runs unchanged (from its own directory, as `make` runs it) while
+# its phases are timed:
+#   script        the whole run
+#   reduce        StreamStats.update, the NumPy reduction of the chunks
+#   histogram     sns.histplot / sns.kdeplot and histplot_counts
+#   tight_layout  Figure.tight_layout (plt.tight_layout included)
+#   savefig       Figure.savefig (plt.savefig included)
+#   import NAME   import of the heavy packages (matplotlib, seaborn, ...)
+# More phases are given with --phase NAME=module:function or
+# NAME=module:Class.method; the functions are wrapped when their module is
+# imported. Code can also mark its own phases with `with phase(name):`.
+#
+# Every phase records wall and CPU time, the SQL statements issued, rows
+# fetched and time spent in execute/fetch calls of sqlite3 inside it, the
+# current and peak RSS and, with --tracemalloc, the peak of the Python
+# allocations (NumPy arrays included). --profile NAME runs that phase under
+# cProfile. The trace is a Chrome trace (chrome://tracing, Perfetto) whose
+# otherData holds the totals per phase, which are also printed at the end.
+#
+# Only this process is traced: reductions sent to worker processes show up
+# as waiting, so profile them with one worker (analysis.py --workers 1).
+#
+# Usage: ./profiling.py [--out trace.json] [--tracemalloc] [--profile savefig]
+#                       [--phase NAME=module:function] script.py [args ...]
+import os
+import sys
+import json
+import time
+import runpy
+import sqlite3
+import argparse
+import platform
+import resource
+import importlib
+import importlib.machinery
+from contextlib import contextmanager
+
+# (phase, module, functions wrapped when the module is imported)
+PHASES = [
+    ('reduce', 'stream_stats', ['StreamStats.update']),
+    ('histogram', 'seaborn', ['histplot', 'kdeplot']),
+    ('histogram', 'stream_stats', ['histplot_counts']),
+    ('tight_layout', 'matplotlib.figure', ['Figure.tight_layout']),
+    ('savefig', 'matplotlib.figure', ['Figure.savefig']),
+]
+# Packages whose import is a phase of its own
+IMPORTS = ['numpy', 'scipy', 'pandas', 'matplotlib', 'seaborn', 'sklearn', 'networkx']
+
+_trace = None
+
+
+def rss():
+    """Current resident memory [MB], None where /proc is not available"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1])*os.sysconf('SC_PAGE_SIZE')/2**20
+    except OSError:
+        return None
+
+
+def max_rss():
+    """Peak resident memory of the process so far [MB]"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak/2**20 if sys.platform == 'darwin' else peak/2**10
+
+
+class Trace:
+    """Nested phases of one run, as Chrome trace events
+
+    `profile` holds the names of the phases run under cProfile, all the
+    occurrences of a name go into one profile.
+    """
+    def __init__(self, tracemalloc=False, profile=()):
+        self.tracemalloc = tracemalloc
+        self.profiles = {}
+        for name in profile:
+            import cProfile
+            self.profiles[name] = cProfile.Profile()
+        self.events = []
+        self.stack = []
+        self.sql = {'statements': 0, 'rows': 0, 'time': 0.0}
+        self.start = time.perf_counter()
+        if tracemalloc:
+            import tracemalloc as tm
+            tm.start()
+
+    def _peak(self):
+        """Peak traced memory since the last reset, which starts over"""
+        import tracemalloc as tm
+        peak = tm.get_traced_memory()[1]
+        tm.reset_peak()
+        return peak
+
+    @contextmanager
+    def phase(self, name, **args):
+        if self.tracemalloc and self.stack:
+            self.stack[-1]['peak'] = max(self.stack[-1]['peak'], self._peak())
+        frame = {'peak': 0, 'sql': dict(self.sql)}
+        self.stack.append(frame)
+        profile = self.profiles.get(name)
+        # One cProfile at a time: nested phases are part of the outer profile
+        if profile is not None and any('profiled' in f for f in self.stack[:-1]):
+            profile = None
+        if profile is not None:
+            frame['profiled'] = name
+            profile.enable()
+        start, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - start, time.process_time() - cpu
+            if profile is not None:
+                profile.disable()
+            self.stack.pop()
+            args.update(cpu=cpu, rss_mb=rss(), max_rss_mb=max_rss(),
+                        **{f'sql_{k}': self.sql[k] - frame['sql'][k] for k in self.sql})
+            if self.tracemalloc:
+                frame['peak'] = max(frame['peak'], self._peak())
+                args['peak_traced_mb'] = frame['peak']/2**20
+                if self.stack:
+                    self.stack[-1]['peak'] = max(self.stack[-1]['peak'], frame['peak'])
+            self.events.append({'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': 0,
+                                'ts': (start - self.start)*1e6, 'dur': wall*1e6,
+                                'args': args})
+
+    def summary(self):
+        """{phase: totals}; time inside nested phases counts for both"""
+        totals = {}
+        for event in self.events:
+            total = totals.setdefault(event['name'], {'count': 0, 'wall': 0.0, 'cpu': 0.0,
+                                                     'sql_statements': 0, 'sql_rows': 0,
+                                                     'sql_time': 0.0, 'max_rss_mb': 0.0})
+            total['count'] += 1
+            total['wall'] += event['dur']/1e6
+            for key in ('cpu', 'sql_statements', 'sql_rows', 'sql_time'):
+                total[key] += event['args'][key]
+            total['max_rss_mb'] = max(total['max_rss_mb'], event['args']['max_rss_mb'])
+            if 'peak_traced_mb' in event['args']:
+                total['peak_traced_mb'] = max(total.get('peak_traced_mb', 0),
+                                              event['args']['peak_traced_mb'])
+        return totals
+
+    def write(self, path, command):
+        meta = {'command': command, 'python': platform.python_version(),
+                'sqlite': sqlite3.sqlite_version, 'platform': platform.platform(),
+                'tracemalloc': self.tracemalloc}
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': sorted(self.events, key=lambda e: e['ts']),
+                       'displayTimeUnit': 'ms',
+                       'otherData': {'meta': meta, 'summary': self.summary()}}, f, indent=1)
+        for name, profile in self.profiles.items():
+            profile.dump_stats(f"{os.path.splitext(path)[0]}.{name.replace(' ', '_')}.prof")
+
+
+@contextmanager
+def phase(name, **args):
+    """Time the block as a phase of the current trace (nothing without one)"""
+    if _trace is None:
+        yield
+    else:
+        with _trace.phase(name, **args):
+            yield
+
+
+def timed(name, function):
+    """`function` run as a phase"""
+    def wrapper(*args, **kwargs):
+        with phase(name):
+            return function(*args, **kwargs)
+    wrapper.__wrapped__ = function
+    for attr in ('__name__', '__qualname__', '__doc__', '__module__'):
+        setattr(wrapper, attr, getattr(function, attr, None))
+    return wrapper
+
+
+def wrap(module, name, attrs):
+    """Replace the functions `attrs` of `module` by phases"""
+    for attr in attrs:
+        owner = module
+        *path, last = attr.split('.')
+        for part in path:
+            owner = getattr(owner, part)
+        function = getattr(owner, last, None)
+        if function is not None and not hasattr(function, '__wrapped__'):
+            setattr(owner, last, timed(name, function))
+
+
+class _CountingCursor(sqlite3.Cursor):
+    """Cursor adding its statements, rows and time to the current trace"""
+    def _time(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            _trace.sql['time'] += time.perf_counter() - start
+
+    def execute(self, *args):
+        _trace.sql['statements'] += 1
+        return self._time(super().execute, *args)
+
+    def executemany(self, *args):
+        _trace.sql['statements'] += 1
+        return self._time(super().executemany, *args)
+
+    def executescript(self, *args):
+        _trace.sql['statements'] += 1
+        return self._time(super().executescript, *args)
+
+    def fetchone(self):
+        row = self._time(super().fetchone)
+        _trace.sql['rows'] += row is not None
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._time(super().fetchmany, *args)
+        _trace.sql['rows'] += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._time(super().fetchall)
+        _trace.sql['rows'] += len(rows)
+        return rows
+
+    def __next__(self):
+        row = self._time(super().__next__)
+        _trace.sql['rows'] += 1
+        return row
+
+
+class _CountingConnection(sqlite3.Connection):
+    """Connection whose cursors (execute() included) count for the trace"""
+    def cursor(self, factory=_CountingCursor):
+        return super().cursor(factory)
+
+    # The shortcuts of sqlite3.Connection do not go through cursor()
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+    def executescript(self, *args):
+        return self.cursor().executescript(*args)
+
+
+def _connect(*args, factory=_CountingConnection, **kwargs):
+    return _connect.original(*args, factory=factory, **kwargs)
+
+
+class _Hooks:
+    """Meta path finder wrapping the phases of the modules as they load"""
+    def __init__(self, modules, imports):
+        self.modules = modules
+        self.imports = set(imports)
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname not in self.modules and fullname not in self.imports:
+            return None
+        spec = importlib.machinery.PathFinder.find_spec(fullname, path)
+        if spec is None or not hasattr(spec.loader, 'exec_module'):
+            return spec
+        exec_module = spec.loader.exec_module
+
+        def load(module):
+            if fullname in self.imports:
+                with phase(f"import {fullname}"):
+                    exec_module(module)
+            else:
+                exec_module(module)
+            for name, attrs in self.modules.get(fullname, []):
+                wrap(module, name, attrs)
+        spec.loader.exec_module = load
+        return spec
+
+
+def instrument(trace, phases=PHASES, imports=IMPORTS):
+    """Make `trace` the current trace and hook the phases into the modules"""
+    global _trace
+    _trace = trace
+    modules = {}
+    for name, module, attrs in phases:
+        modules.setdefault(module, []).append((name, attrs))
+    for module, wrapped in modules.items():
+        if module in sys.modules:
+            for name, attrs in wrapped:
+                wrap(sys.modules[module], name, attrs)
+    sys.meta_path.insert(0, _Hooks(modules, [m for m in imports if m not in sys.modules]))
+    _connect.original = sqlite3.connect
+    sqlite3.connect = _connect
+
+
+def report(summary, file=sys.stderr):
+    print(f"{'phase':<24}{'calls':>7}{'wall [s]':>10}{'cpu [s]':>10}{'SQL':>8}"
+          f"{'rows':>10}{'SQL [s]':>9}{'maxRSS':>9}", file=file)
+    for name, total in sorted(summary.items(), key=lambda item: -item[1]['wall']):
+        print(f"{name:<24}{total['count']:>7}{total['wall']:10.3f}{total['cpu']:10.3f}"
+              f"{total['sql_statements']:>8}{total['sql_rows']:>10}{total['sql_time']:9.3f}"
+              f"{total['max_rss_mb']:9.1f}", file=file)
+
+
+def run(script, argv, trace):
+    """Run `script` as __main__ from its directory, within a 'script' phase"""
+    script = os.path.abspath(script)
+    cwd, path, sys_argv = os.getcwd(), list(sys.path), sys.argv
+    os.chdir(os.path.dirname(script))
+    sys.path[0] = os.path.dirname(script)
+    sys.argv = [script] + argv
+    try:
+        with trace.phase('script', script=script):
+            runpy.run_path(script, run_name='__main__')
+    except SystemExit as exit:
+        if exit.code not in (None, 0):
+            raise
+    finally:
+        os.chdir(cwd)
+        sys.path[:], sys.argv = path, sys_argv
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--out', help="trace file (default: <script>.trace.json)")
+    parser.add_argument('--tracemalloc', action='store_true',
+                        help="peak Python allocations of every phase (slower)")
+    parser.add_argument('--profile', action='append', default=[], metavar='PHASE',
+                        help="run the phase under cProfile (<out>.<phase>.prof)")
+    parser.add_argument('--phase', action='append', default=[],
+                        metavar='NAME=module:function', help="one more phase")
+    parser.add_argument('script')
+    parser.add_argument('args', nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    phases = list(PHASES)
+    for spec in args.phase:
+        name, _, target = spec.partition('=')
+        module, _, function = target.partition(':')
+        if not (name and module and function):
+            parser.error(f"--phase {spec}: expected NAME=module:function")
+        phases.append((name, module, [function]))
+    out = os.path.abspath(args.out or os.path.splitext(args.script)[0] + '.trace.json')
+
+    trace = Trace(args.tracemalloc, args.profile)
+    instrument(trace, phases)
+    sys.modules.setdefault('profiling', sys.modules['__main__'])
+    try:
+        run(args.script, args.args, trace)
+    finally:
+        trace.write(out, [args.script] + args.args)
+        report(trace.summary())
+        print(f"trace written to {out}", file=sys.stderr)
+        for name, profile in trace.profiles.items():
+            import pstats
+            print(f"\n=== cProfile of {name} ===", file=sys.stderr)
+            pstats.Stats(profile, stream=sys.stderr).sort_stats('cumulative').print_stats(15)
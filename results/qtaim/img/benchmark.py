@@ -0,0 +1,190 @@
+#!/usr/bin/python3
+# Scaling benchmark of the analysis scripts on synthetic databases
+#
+# Databases of every size are written once by synthetic_db.py into the work
+# directory and reused by the next runs. Every case runs in a fresh process so
+# that its peak RSS is its own; the SQL statements are counted with a trace
+# callback on every connection the process opens. Workers default to 1: the
+# statements of worker processes would not be counted.
+#
+# Cases: dipole-extract / pol-extract (shards.extract of the columns),
+#        dipole-stats / pol-stats (statistics() of the histogram scripts, no
+#        cache) and memory-plan (memory.py models over the natoms of the
+#        systems table).
+#
+# Usage: ./benchmark.py [--atoms 100 10000 1000000] [--layout long]
+#                       [--out bench.json] [--compare baseline.json]
+import os
+import sys
+import json
+import time
+import sqlite3
+import platform
+import argparse
+import resource
+from datetime import datetime
+from multiprocessing import get_context
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import synthetic_db
+
+CASES = ['dipole-extract', 'dipole-stats', 'pol-extract', 'pol-stats', 'memory-plan']
+# Database kind of every case
+KIND = {'dipole-extract': 'q_dp_pol', 'dipole-stats': 'q_dp_pol',
+        'pol-extract': 'pol_150', 'pol-stats': 'pol_150', 'memory-plan': 'q_dp_pol'}
+# Slower by this factor and by this many seconds (median of the repeats)
+# than the baseline is a regression; below that it is noise
+TOLERANCE = 1.2
+MIN_DELTA = 0.05
+
+
+def database(workdir, natoms, kind, layout, seed=0):
+    """Path of a synthetic database, written if not there yet"""
+    path = os.path.join(workdir, f"{kind}_{layout}_{natoms}_{seed}.db")
+    if not os.path.exists(path):
+        partial = path + ".partial"
+        if os.path.exists(partial):
+            os.remove(partial)
+        synthetic_db.generate(partial, natoms, kind, seed, layout)
+        os.replace(partial, path)
+    return path
+
+
+def peak_rss():
+    """Peak resident memory of this process [MB]"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak/2**20 if sys.platform == 'darwin' else peak/2**10
+
+
+def run_case(case, path, workers):
+    """Wall time [s], SQL statements and peak RSS [MB] of one case
+
+    Runs in a fresh process (see benchmark()).
+    """
+    statements = [0]
+    connect = sqlite3.connect
+
+    def counted(*args, **kwargs):
+        conn = connect(*args, **kwargs)
+        conn.set_trace_callback(lambda sql: statements.__setitem__(0, statements[0] + 1))
+        return conn
+    sqlite3.connect = counted
+
+    start = time.perf_counter()
+    if case in ('dipole-extract', 'pol-extract'):
+        from shards import extract
+        from differences import DIPOLE_COLUMNS, DIPOLE_WHERE, POL_COLUMNS
+        if case == 'dipole-extract':
+            data = extract([path], DIPOLE_COLUMNS, where=DIPOLE_WHERE, workers=workers)
+        else:
+            data = extract([path], POL_COLUMNS, workers=workers)
+        size = len(data['system'])
+    elif case == 'dipole-stats':
+        import dipolemoment_histo
+        stats, _ = dipolemoment_histo.statistics([path], cache=None, workers=workers)
+        size = stats[0].n
+    elif case == 'pol-stats':
+        import plot_pol_aimall_adf
+        stats, _ = plot_pol_aimall_adf.statistics([path], cache=None, workers=workers)
+        size = stats[0].n
+    elif case == 'memory-plan':
+        import memory
+        natoms = memory.read_natoms([path])
+        memory.plan_memory(natoms)
+        size = len(natoms)
+    else:
+        raise ValueError(f"Unknown case {case}")
+    wall = time.perf_counter() - start
+    return {'wall': wall, 'statements': statements[0], 'rss_mb': peak_rss(), 'size': int(size)}
+
+
+def benchmark(sizes, cases=CASES, layout='wide', repeat=1, workers=1,
+              workdir='.benchmark', seed=0, verbose=True):
+    """Results of every case on databases of every size
+
+    Best of `repeat` runs, with the median of their wall times for compare().
+    """
+    os.makedirs(workdir, exist_ok=True)
+    context = get_context('spawn')
+    results = []
+    for natoms in sizes:
+        for case in cases:
+            start = time.perf_counter()
+            path = database(workdir, natoms, KIND[case], layout, seed)
+            generated = time.perf_counter() - start
+            runs = []
+            for _ in range(repeat):
+                with ProcessPoolExecutor(1, mp_context=context) as pool:
+                    runs.append(pool.submit(run_case, case, path, workers).result())
+            best = min(runs, key=lambda run: run['wall'])
+            walls = [run['wall'] for run in runs]
+            result = {'case': case, 'natoms': natoms, 'layout': layout,
+                      'kind': KIND[case], 'workers': workers, 'walls': walls,
+                      'median': float(np.median(walls)), **best}
+            results.append(result)
+            if verbose:
+                note = f" (database written in {generated:.1f} s)" if generated > 1 else ""
+                print(f"{case:<16}{natoms:>9} atoms {best['wall']:9.3f} s "
+                      f"{best['rss_mb']:8.1f} MB {best['statements']:8d} SQL{note}",
+                      flush=True)
+    return results
+
+
+def metadata():
+    return {'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(), 'numpy': np.__version__,
+            'sqlite': sqlite3.sqlite_version, 'platform': platform.platform(),
+            'cpu_count': os.cpu_count()}
+
+
+def compare(results, baseline, tolerance=TOLERANCE, min_delta=MIN_DELTA):
+    """Print the ratios to a previous run, returns the number of regressions
+
+    Times are compared on the median of the repeats; a case regresses when
+    it is both `tolerance` times and `min_delta` seconds slower, or issues
+    more SQL statements.
+    """
+    key = lambda r: (r['case'], r['natoms'], r['layout'], r['workers'])
+    before = {key(r): r for r in baseline['results']}
+    regressions = 0
+    print(f"{'case':<16}{'natoms':>9}{'time':>9}{'RSS':>9}{'SQL':>9}")
+    for result in results:
+        old = before.get(key(result))
+        if old is None:
+            continue
+        now, before_median = result['median'], float(np.median(old['walls']))
+        ratios = [now/before_median] + [result[k]/old[k] if old[k] else float('nan')
+                                        for k in ('rss_mb', 'statements')]
+        slower = (ratios[0] > tolerance and now - before_median > min_delta) or ratios[2] > 1
+        regressions += slower
+        print(f"{result['case']:<16}{result['natoms']:>9}"
+              + "".join(f"{ratio:9.2f}" for ratio in ratios)
+              + ("  REGRESSION" if slower else ""))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--atoms', type=int, nargs='+', default=[100, 10000, 100000],
+                        help="sizes of the databases (up to 1000000)")
+    parser.add_argument('--cases', nargs='+', choices=CASES, default=CASES)
+    parser.add_argument('--layout', choices=['wide', 'long'], default='wide')
+    parser.add_argument('--repeat', type=int, default=3, help="runs of every case (best and median)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="processes of the reductions (statements only counted for 1)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workdir', default='.benchmark', help="synthetic databases")
+    parser.add_argument('--out', default='benchmark.json')
+    parser.add_argument('--compare', metavar='BASELINE', help="previous --out to compare with")
+    parser.add_argument('--min-delta', type=float, default=MIN_DELTA,
+                        help="seconds slower before a case counts as a regression")
+    args = parser.parse_args()
+
+    results = benchmark(args.atoms, args.cases, args.layout, args.repeat, args.workers,
+                        args.workdir, args.seed)
+    with open(args.out, 'w') as f:
+        json.dump({'meta': metadata(), 'results': results}, f, indent=1)
+    print(f"results written to {args.out}")
+    if args.compare:
+        with open(args.compare) as f:
+            sys.exit(1 if compare(results, json.load(f), min_delta=args.min_delta) else 0)
@@ -0,0 +1,196 @@
+#!/usr/bin/python3
+# Fit the maxCP allocation heuristics of memory.py to observed CP counts
+#
+# Every family is fitted by least squares to the observed number of critical
+# points with the constraint of never allocating less than observed (no
+# reallocation). The systems are first reduced to one entry per number of
+# atoms (count, sum, sum of squares and maximum of the observed CPs), so the
+# fits only see a few hundred points whatever the size of the dataset.
+#
+# Usage: ./calibrate_maxcp.py q_dp_pol.db [--column ncp]
+#        ./calibrate_maxcp.py counts.csv          (columns natoms,ncp)
+import argparse
+import warnings
+import numpy as np
+from memory import (compute_maxCP, castor_implementation, rodrigez_implementation,
+                    compute_maxCP_smooth, modified_sqrt_function)
+
+# Memory per CP as in memory.py [MB = factor*CP/1024]
+FACTOR = {'Limit of maxCP': 26, 'Current Implementation': 26,
+          'Original Implementation': 27, 'Function defined by parts': 26,
+          '√n function with exponential decay': 26}
+
+
+def read_counts(path, column='ncp', where=None):
+    """natoms and observed CP count of every system (database or CSV)"""
+    if path.endswith('.csv'):
+        table = np.genfromtxt(path, delimiter=',', names=True)
+        return table['natoms'].astype(np.int64), table[column].astype(float)
+    from shards import connect
+    conn = connect(path)
+    query = f"SELECT natoms, {column} FROM systems WHERE {column} IS NOT NULL"
+    if where:
+        query += f" AND ({where})"
+    rows = np.array(conn.execute(query).fetchall(), dtype=float).reshape(-1, 2)
+    conn.close()
+    return rows[:,0].astype(np.int64), rows[:,1]
+
+
+def summarize(natoms, observed):
+    """Sufficient statistics of the observed counts per number of atoms"""
+    sizes, inverse, counts = np.unique(natoms, return_inverse=True,
+                                       return_counts=True)
+    inverse = inverse.ravel()
+    total = np.bincount(inverse, observed)
+    squares = np.bincount(inverse, observed**2)
+    # Largest observation of every size: last one once sorted by (size, count)
+    peak = observed[np.lexsort((observed, inverse))][np.cumsum(counts) - 1]
+    return {'sizes': sizes.astype(float), 'counts': counts, 'total': total,
+            'squares': squares, 'peak': peak}
+
+
+def fit_scale(shape, grid, data, refine=2):
+    """Best (a, s) of a*shape(n, s) with a*shape >= every observation
+
+    For each s of the grid the optimal scale is closed form: the least
+    squares one, raised to the smallest feasible one if needed. The grid is
+    refined around the best s `refine` times.
+    """
+    n, c = data['sizes'], data['counts']
+    for _ in range(refine + 1):
+        g = shape(n[None, :], grid[:, None])
+        gg = np.sum(c*g**2, axis=1)
+        gy = np.sum(g*data['total'], axis=1)
+        a = np.maximum(gy/gg, np.max(data['peak']/g, axis=1))
+        sse = a**2*gg - 2*a*gy + data['squares'].sum()
+        best = np.argmin(sse)
+        # Finer grid between the neighbours of the best value
+        lo, hi = grid[max(best - 1, 0)], grid[min(best + 1, len(grid) - 1)]
+        result = a[best], grid[best]
+        grid = np.geomspace(lo, hi, len(grid))
+    return result
+
+
+def fit_grid(model, grids, data, batch=2048, refine=3, names=None):
+    """Best parameters of `model(n, *params)` on the product of `grids`
+
+    Among the combinations never below the observations the one with the
+    smallest squared error wins (or the smallest worst shortfall if none).
+    As in fit_scale every grid is refined `refine` times between the
+    neighbours of the best value; a best value on the edge of its grid
+    extends the grid outwards instead. A parameter still on the edge after
+    the refinements is reported: the data do not pin it down and the value
+    is set by where the search stopped.
+    """
+    grids = [np.asarray(g, dtype=float) for g in grids]
+    names = names or [f"parameter {i}" for i in range(len(grids))]
+    for step in range(refine + 1):
+        best, index = search_grid(model, grids, data, batch)
+        if step == refine:
+            break
+        grids = [refine_grid(g, j) for g, j in zip(grids, index)]
+    for name, value, g, j in zip(names, best, grids, index):
+        if j in (0, len(g) - 1):
+            warnings.warn(f"{model.__name__}: {name} = {value:.4g} still on the "
+                          f"edge of its grid [{g[0]:.4g}, {g[-1]:.4g}] after {refine} "
+                          f"refinements", stacklevel=2)
+    return best
+
+
+def search_grid(model, grids, data, batch=2048):
+    """(best parameters, their index in every grid) on the product of `grids`"""
+    n, c = data['sizes'], data['counts']
+    params = [p.ravel() for p in np.meshgrid(*grids, indexing='ij')]
+    best, best_key = None, None
+    for i in range(0, len(params[0]), batch):
+        chunk = [p[i:i + batch, None] for p in params]
+        f = model(n[None, :], *chunk)
+        sse = np.sum(c*f**2 - 2*f*data['total'], axis=1)
+        shortfall = np.max(data['peak'] - f, axis=1)
+        # Feasible first, then the squared error
+        key = np.where(shortfall <= 0, sse, np.inf)
+        j = np.argmin(key) if np.isfinite(key).any() else np.argmin(shortfall)
+        candidate = (0 if np.isfinite(key[j]) else 1,
+                     key[j] if np.isfinite(key[j]) else shortfall[j])
+        if best_key is None or candidate < best_key:
+            best_key, best = candidate, (i + j)
+    index = np.unravel_index(best, [len(g) for g in grids])
+    return [p[best] for p in params], [int(j) for j in index]
+
+
+def refine_grid(grid, j):
+    """Finer grid around grid[j], or one span further out if j is an edge
+
+    Positive grids are refined geometrically (the parameters are scales).
+    """
+    geometric = grid[0] > 0
+    space = np.geomspace if geometric else np.linspace
+    if 0 < j < len(grid) - 1:
+        return space(grid[j - 1], grid[j + 1], len(grid))
+    if j == 0:
+        lo = grid[0]**2/grid[-1] if geometric else 2*grid[0] - grid[-1]
+        return space(lo, grid[1], len(grid))
+    hi = grid[-1]**2/grid[0] if geometric else 2*grid[-1] - grid[0]
+    return space(grid[-2], hi, len(grid))
+
+
+def evaluate(allocated, natoms, observed, factor):
+    """Overflow rate, wasted and peak memory [MB] of a per-system allocation"""
+    overflow = np.mean(allocated < observed)
+    wasted = factor*np.sum(np.maximum(allocated - observed, 0))/1024
+    return overflow, wasted, factor*allocated.max()/1024
+
+
+def calibrate(natoms, observed):
+    """Hand-tuned and fitted parameters of every family with their scores"""
+    keep = natoms > 0
+    natoms, observed = natoms[keep], observed[keep]
+    data = summarize(natoms, observed)
+    scales = np.geomspace(0.05, 2000, 400)
+
+    a, s = fit_scale(lambda n, s: castor_implementation(n, 1, s), scales, data)
+    a_mod, s_mod = fit_scale(lambda n, s: modified_sqrt_function(n, 1, s), scales, data)
+    k = max(np.sum(data['sizes']*data['total'])/np.sum(data['counts']*data['sizes']**2),
+            np.max(data['peak']/data['sizes']))
+    smooth = fit_grid(compute_maxCP_smooth,
+                      [np.geomspace(0.01, 1, 9), np.linspace(5, 200, 9),
+                       np.geomspace(1, 1e4, 33), np.geomspace(0.1, 100, 13)], data,
+                      names=['k1', 'D3', 'C', 'D'])
+
+    families = [
+        ('Limit of maxCP', {}, {}, lambda x, **p: compute_maxCP(x)),
+        ('Current Implementation', {'a': 50, 's': 50}, {'a': a, 's': s},
+         castor_implementation),
+        ('Original Implementation', {'k': 256}, {'k': k}, rodrigez_implementation),
+        ('Function defined by parts', {'k1': 0.1, 'D3': 50, 'C': 50, 'D': 5},
+         dict(zip(['k1', 'D3', 'C', 'D'], smooth)), compute_maxCP_smooth),
+        ('√n function with exponential decay', {'a': 5, 's': 1},
+         {'a': a_mod, 's': s_mod}, modified_sqrt_function),
+    ]
+    report = []
+    x = natoms.astype(float)
+    for label, tuned, fitted, model in families:
+        for kind, params in (('hand-tuned', tuned), ('fitted', fitted)):
+            if kind == 'fitted' and not params:
+                continue
+            # Allocations are integers, rounded up so a fitted model never falls short
+            allocated = np.ceil(model(x, **params) - 1e-9) if kind == 'fitted' \
+                else np.trunc(model(x, **params))
+            report.append((label, kind, params,
+                           *evaluate(allocated, natoms, observed, FACTOR[label])))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('source', help="database or CSV with natoms and the CP counts")
+    parser.add_argument('--column', default='ncp', help="column with the CP counts")
+    parser.add_argument('--where', help="filter on the systems table")
+    args = parser.parse_args()
+
+    natoms, observed = read_counts(args.source, args.column, args.where)
+    print(f"=== maxCP CALIBRATION ({len(natoms)} systems) ===")
+    for label, kind, params, overflow, wasted, peak in calibrate(natoms, observed):
+        values = ", ".join(f"{k}={v:.4g}" for k, v in params.items())
+        print(f"{label:<36} {kind:<11} overflow: {100*overflow:6.2f} %, "
+              f"wasted: {wasted:12.1f} MB, peak: {peak:9.1f} MB  {values}")
@@ -0,0 +1,99 @@
+#!/usr/bin/python3
+# On-disk cache of the columns extracted from the QTAIM databases
+#
+# The first run stores every extracted column as a .npy file (plus the chunk
+# layout of the extraction); later runs with the same databases (path, size
+# and mtime), columns and filters np.load(mmap_mode='r') them instead of
+# querying SQLite again, e.g. while only the figure styling changes.
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+
+# Text columns (symbol) are stored with a fixed width so they can be mapped
+TEXT = 'U8'
+
+
+def stamp(paths):
+    """(path, size, mtime) of the databases, the cache is valid while they match"""
+    stamps = []
+    for path in paths:
+        info = os.stat(path)
+        stamps.append([os.path.abspath(path), info.st_size, info.st_mtime_ns])
+    return stamps
+
+
+def entry(cache, paths, columns, where=None, symbol=None, batch=None):
+    """Directory of the cache entry for some databases, columns and filters
+
+    `batch` is part of the key as the task split sets the chunks stored.
+    """
+    what = json.dumps([[os.path.abspath(p) for p in paths], list(columns),
+                       where, symbol, batch])
+    return os.path.join(cache, hashlib.sha1(what.encode()).hexdigest()[:16])
+
+
+def load(directory, paths):
+    """(columns, chunks, nsystems) of a valid entry or None if it is stale
+
+    Columns are read-only memory maps, `chunks` holds the (task, rows) of
+    every chunk in extraction order.
+    """
+    try:
+        with open(os.path.join(directory, 'key.json')) as f:
+            key = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if key['databases'] != stamp(paths):
+        return None
+    data = {col: np.load(os.path.join(directory, f'{col}.npy'), mmap_mode='r')
+            for col in key['columns']}
+    chunks = np.load(os.path.join(directory, 'chunks.npy'))
+    return data, chunks, key['nsystems']
+
+
+def prepare(directory):
+    """Empty the entry and return the directory for the parts of the tasks"""
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+    parts = os.path.join(directory, 'parts')
+    os.makedirs(parts)
+    return parts
+
+
+def write_part(part, chunk):
+    """Append a chunk of columns to the raw files of a task"""
+    for col, values in chunk.items():
+        if values.dtype == object:
+            values = values.astype(TEXT)
+        with open(f"{part}.{col}", 'ab') as f:
+            values.tofile(f)
+
+
+def store(directory, paths, dtypes, parts, chunks, nsystems):
+    """Join the task parts into one .npy per column and validate the entry
+
+    `dtypes` maps the columns to their dtype (object for text), `parts` is
+    the part prefix of every task in order and `chunks` the (task, rows) list.
+    """
+    chunks = np.asarray(chunks, dtype=np.int64).reshape(-1, 2)
+    total = int(chunks[:,1].sum())
+    for col, dtype in dtypes.items():
+        dtype = np.dtype(TEXT) if dtype == object else np.dtype(dtype)
+        with open(os.path.join(directory, f'{col}.npy'), 'wb') as out:
+            np.lib.format.write_array_header_1_0(
+                out, {'descr': np.lib.format.dtype_to_descr(dtype),
+                      'fortran_order': False, 'shape': (total,)})
+            for part in parts:
+                if os.path.exists(f"{part}.{col}"):
+                    with open(f"{part}.{col}", 'rb') as f:
+                        shutil.copyfileobj(f, out)
+    np.save(os.path.join(directory, 'chunks.npy'), chunks)
+    shutil.rmtree(os.path.join(directory, 'parts'))
+
+    # Written last: an entry without key.json is never used
+    key = {'databases': stamp(paths), 'columns': list(dtypes),
+           'nsystems': nsystems}
+    with open(os.path.join(directory, 'key.json'), 'w') as f:
+        json.dump(key, f)
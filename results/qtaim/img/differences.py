@@ -0,0 +1,38 @@
+#!/usr/bin/python3
+# ADF - AIMAll differences computed on a chunk of rows of the QTAIM databases
+#
+# Kept at module level (not inside the plot scripts) so the worker processes
+# of shards.accumulate can import them.
+import numpy as np
+
+# Systems used for the dipole moments
+DIPOLE_WHERE = "normal_termination = 7 AND aimall = 1"
+DIPOLE_COLUMNS = ['mu_adf_norm', 'mu_aimall_norm',
+                  'mu_adf_intra_norm', 'mu_aimall_intra_norm',
+                  'mu_adf_inter_norm', 'mu_aimall_inter_norm']
+DIPOLE_LABELS = ['Total', 'Intra-atomic', 'Inter-atomic']
+
+POL_COLUMNS = ['pol_l1_adf', 'pol_l2_adf', 'pol_l3_adf', 'pol_mean_adf',
+               'pol_l1_aimall', 'pol_l2_aimall', 'pol_l3_aimall', 'pol_mean_aimall']
+POL_LABELS = ['Mean', 'λ1', 'λ2', 'λ3']
+
+
+def dipole_valid(chunk):
+    """Atoms with both the ADF and the AIMAll dipole moment"""
+    return ~(np.isnan(chunk['mu_adf_norm']) | np.isnan(chunk['mu_aimall_norm']))
+
+
+def dipole_differences(chunk):
+    """Total, intra and inter dipole differences (atoms with both moments)"""
+    ok = dipole_valid(chunk)
+    return [chunk['mu_adf_norm'][ok] - chunk['mu_aimall_norm'][ok],
+            chunk['mu_adf_intra_norm'][ok] - chunk['mu_aimall_intra_norm'][ok],
+            chunk['mu_adf_inter_norm'][ok] - chunk['mu_aimall_inter_norm'][ok]]
+
+
+def polarisability_differences(chunk):
+    """Mean, λ1, λ2 and λ3 polarisability differences (missing values as 0)"""
+    pols = np.column_stack([chunk[col] for col in POL_COLUMNS])
+    pols[np.isnan(pols)] = 0
+    diff = pols[:,:4] - pols[:,4:]
+    return [diff[:,3], diff[:,0], diff[:,1], diff[:,2]]
@@ -0,0 +1,226 @@
+#!/usr/bin/python3
+# Per-element (or per-system) statistics of the ADF - AIMAll differences
+#
+# Everything is computed in one vectorized pass: the groups are factorized to
+# integer codes and reduced with np.bincount (count, mean, std, RMSE) and a
+# single sort (median). Bootstrap confidence intervals draw whole batches of
+# resamples at once.
+#
+# Usage: ./element_stats.py dipole q_dp_pol.db [--by system] [--panels]
+#        ./element_stats.py pol pol_150.db
+import csv
+import argparse
+import numpy as np
+from shards import connect, expand, extract
+from qtaim_db import system_names
+from differences import (DIPOLE_WHERE, DIPOLE_COLUMNS, DIPOLE_LABELS, POL_COLUMNS,
+                         POL_LABELS, dipole_valid, dipole_differences,
+                         polarisability_differences)
+
+# Bytes of the bootstrap resamples drawn at once
+MEMORY = 2**28
+# Groups larger than EXACT are bootstrapped over STRATA runs of sorted values
+EXACT = 4096
+STRATA = 1024
+# Columns of the tidy table
+FIELDS = ['series', 'group', 'count', 'mean', 'std', 'median', 'rmse',
+          'mean_ci_low', 'mean_ci_high']
+
+
+def factorize(labels):
+    """(unique labels, integer code of every label)"""
+    uniques, codes = np.unique(np.asarray(labels), return_inverse=True)
+    return uniques, codes.ravel()
+
+
+def group_stats(values, codes, ngroups):
+    """Count, mean, std, median and RMSE of `values` for every group"""
+    values = np.asarray(values, dtype=float)
+    count = np.bincount(codes, minlength=ngroups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.bincount(codes, values, ngroups)/count
+        std = np.sqrt(np.bincount(codes, (values - mean[codes])**2, ngroups)/count)
+        rmse = np.sqrt(np.bincount(codes, values**2, ngroups)/count)
+
+    # Median: sort by group and value, then pick the middle of every group
+    ordered = values[np.lexsort((values, codes))]
+    start = np.cumsum(count) - count
+    lo = np.minimum(start + (count - 1)//2, len(values) - 1)
+    hi = np.minimum(start + count//2, len(values) - 1)
+    median = np.where(count > 0, 0.5*(ordered[lo] + ordered[hi]), np.nan)
+    return {'count': count, 'mean': mean, 'std': std, 'median': median,
+            'rmse': rmse}
+
+
+def bootstrap_ci(values, codes, ngroups, statistic='mean', nboot=200,
+                 level=0.95, seed=0, memory=MEMORY, exact=EXACT, strata=STRATA):
+    """Percentile bootstrap interval of the group mean or RMSE, shape (2, ngroups)
+
+    Every replicate resamples each group with replacement. Groups of up to
+    `exact` values redraw every value, in batches of replicates that keep
+    the resamples within `memory` bytes. Larger groups are split into
+    `strata` runs of their sorted values and a replicate draws how many
+    values come from every run (multinomial counts); the sum of the values
+    drawn within a run gets the exact conditional mean and variance. The cost
+    is nboot*strata per large group instead of nboot*n.
+    """
+    values = np.asarray(values, dtype=float)
+    if statistic == 'rmse':
+        values = values**2
+    order = np.lexsort((values, codes))
+    values, codes = values[order], codes[order]
+    count = np.bincount(codes, minlength=ngroups)
+    first = np.cumsum(count) - count
+    rng = np.random.default_rng(seed)
+    boot = np.full((nboot, ngroups), np.nan)
+
+    # Small groups: every value redrawn
+    small = (count > 0) & (count <= exact)
+    rows = small[codes]
+    if rows.any():
+        sub, sub_codes = values[rows], codes[rows]
+        sub_count = count[small]
+        sub_first = np.cumsum(sub_count) - sub_count
+        size = np.repeat(sub_count, sub_count)
+        start = np.repeat(sub_first, sub_count)
+        n = len(sub)
+        batch = max(1, memory//(24*n))
+        for b0 in range(0, nboot, batch):
+            b = min(batch, nboot - b0)
+            # Resamples stay sorted by group, so the sums are one reduceat
+            sample = sub[start + (rng.random((b, n))*size).astype(np.int64)]
+            boot[b0:b0 + b, small] = np.add.reduceat(sample, sub_first, axis=1)/sub_count
+
+    # Large groups: multinomial counts over the runs of sorted values
+    for g in np.flatnonzero(count > exact):
+        group = values[first[g]:first[g] + count[g]]
+        runs = np.array_split(group, strata)
+        size = np.array([len(r) for r in runs])
+        mean = np.array([r.mean() for r in runs])
+        var = np.array([r.var() for r in runs])
+        drawn = rng.multinomial(count[g], size/count[g], size=nboot)
+        sums = drawn @ mean + np.sqrt(drawn @ var)*rng.standard_normal(nboot)
+        boot[:, g] = sums/count[g]
+
+    if statistic == 'rmse':
+        boot = np.sqrt(boot)
+    tail = (1 - level)/2
+    return np.quantile(boot, [tail, 1 - tail], axis=0)
+
+
+def tidy_table(series, labels, codes, groups, nboot=200):
+    """Rows (series, group, count, mean, std, median, rmse, mean CI) for all series"""
+    rows = []
+    for label, (values, valid) in zip(labels, series):
+        values, group = values[valid], codes[valid]
+        stats = group_stats(values, group, len(groups))
+        low, high = bootstrap_ci(values, group, len(groups), nboot=nboot)
+        for g, name in enumerate(groups):
+            if stats['count'][g] == 0:
+                continue
+            row = {'series': label, 'group': name}
+            row.update((key, stats[key][g]) for key in stats)
+            row.update(mean_ci_low=low[g], mean_ci_high=high[g])
+            rows.append(row)
+    return rows
+
+
+def write_table(rows, filename):
+    """Write the tidy table as CSV (only the header if there are no rows)"""
+    with open(filename, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def print_table(rows):
+    print(f"{'series':<14}{'group':<12}{'count':>9}{'mean':>10}{'std':>10}"
+          f"{'median':>10}{'rmse':>10}{'95% CI (mean)':>22}")
+    for r in rows:
+        print(f"{r['series']:<14}{str(r['group']):<12}{r['count']:>9}"
+              f"{r['mean']:>10.4f}{r['std']:>10.4f}{r['median']:>10.4f}"
+              f"{r['rmse']:>10.4f}   [{r['mean_ci_low']:.4f}, {r['mean_ci_high']:.4f}]")
+
+
+def plot_panels(series, labels, codes, groups, bins, colours, filename):
+    """One histogram panel per group, every series overlaid"""
+    import matplotlib.pyplot as plt
+    nbins = len(bins) - 1
+    ncols = min(len(groups), 3)
+    nrows = -(-len(groups)//ncols)
+    fig, axes = plt.subplots(nrows, ncols, figsize=(5*ncols, 4*nrows),
+                             squeeze=False, sharex=True)
+    for (values, valid), label, colour in zip(series, labels, colours):
+        values, group = values[valid], codes[valid]
+        # All the group histograms in one bincount
+        k = np.searchsorted(bins, values, side='right') - 1
+        k[values == bins[-1]] = nbins - 1
+        inside = (k >= 0) & (k < nbins)
+        counts = np.bincount(group[inside]*nbins + k[inside],
+                             minlength=len(groups)*nbins).reshape(-1, nbins)
+        for ax, name, c in zip(axes.flat, groups, counts):
+            ax.stairs(c, bins, fill=True, alpha=0.4, color=colour, label=label)
+            ax.set_title(str(name), fontsize=14, fontweight='bold')
+    for ax in axes.flat[len(groups):]:
+        ax.set_visible(False)
+    axes.flat[0].legend(loc='upper right', fontsize=10)
+    fig.tight_layout()
+    fig.savefig(filename, dpi=300, bbox_inches='tight')
+    plt.close(fig)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('property', choices=['dipole', 'pol'])
+    parser.add_argument('databases', nargs='+', help="database files or globs")
+    parser.add_argument('--by', choices=['element', 'system'], default='element')
+    parser.add_argument('--nboot', type=int, default=200,
+                        help="bootstrap replicates (cost nboot*count per group, nboot*1024 above 4096 atoms)")
+    parser.add_argument('--panels', action='store_true',
+                        help="also draw one histogram panel per element")
+    parser.add_argument('--cache', default='.qtaim_cache')
+    args = parser.parse_args()
+
+    if args.property == 'dipole':
+        where, columns, labels = DIPOLE_WHERE, DIPOLE_COLUMNS, DIPOLE_LABELS
+        bins = np.linspace(-0.15, 0.15, 120)
+    else:
+        where, columns, labels = None, POL_COLUMNS, POL_LABELS
+        bins = np.linspace(-5, 5, 100)
+    data = extract(args.databases, columns + ['symbol'], where=where,
+                   cache=args.cache)
+
+    # Every series with the rows it is defined on
+    if args.property == 'dipole':
+        ok = dipole_valid(data)
+        data = {col: values[ok] for col, values in data.items()}
+        differences = dipole_differences(data)
+    else:
+        differences = polarisability_differences(data)
+    series = [(x, ~np.isnan(x)) for x in differences]
+
+    if args.by == 'element':
+        groups, codes = factorize(data['symbol'])
+    else:
+        # Systems of different databases are different groups; 'system' is
+        # the index among all the systems of its database (shards.plan)
+        keys, codes = np.unique(np.column_stack([data['database'], data['system']]),
+                                axis=0, return_inverse=True)
+        codes = codes.ravel()
+        paths = expand(args.databases)
+        names = []
+        for path in paths:
+            conn = connect(path)
+            names.append(system_names(conn, where))
+            conn.close()
+        groups = [f"{paths[database]}:{names[database][system]}" for database, system in keys]
+
+    rows = tidy_table(series, labels, codes, groups, args.nboot)
+    if not rows:
+        print(f"No {args.property} values in {', '.join(args.databases)}")
+    print_table(rows)
+    write_table(rows, f"{args.property}_{args.by}_stats.csv")
+    if args.panels and args.by == 'element' and rows:
+        colours = ['#2E86AB', '#A23B72', '#F18F01', '#6A994E']  # ! COLOUR !
+        plot_panels(series, labels, codes, groups, bins, colours,
+                    f"histogram_{args.property}_elements.pdf")
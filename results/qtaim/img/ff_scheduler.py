@@ -0,0 +1,247 @@
+#!/usr/bin/python3
+# Local scheduler of the finite-field polarisability workflow
+#
+# Every system needs the seven single points of plams_diagram.py (no field,
+# ±ε along x, y, z); once the seven are in, the derivative step (pol_tensor)
+# gives the atomic tensors. The single points of many systems run on a
+# bounded process pool, a system at a time so few partial results are kept;
+# failed runs are retried, and finished systems are written in batches to a
+# database in the long layout (migrate_atoms.py):
+#
+#   systems(system_id, system, natoms, normal_termination, aimall, attempts, time)
+#   atoms(atom_id, system_id, symbol, mu_adf_norm, pol_*_adf, mu_f<run>_<axis>_adf)
+#
+# normal_termination counts the runs that ended well (7 for a complete
+# system, as in the other databases). Systems already complete in the
+# database are skipped, so an interrupted run just continues.
+#
+# The calculator is any picklable callable calculator(system, field) returning
+# (symbols, atomic dipoles (natoms, 3)); StandIn fakes ADF for testing and
+# for tuning the number of workers.
+#
+# Usage: ./ff_scheduler.py out.db --systems 1000 [--workers 4] [--work 0.01]
+#                          [--failure-rate 0.05] [--calculator module:Class]
+import os
+import time
+import zlib
+import sqlite3
+import argparse
+import importlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+from pol_tensor import FIELD, FIELDS, NRUNS, from_dipoles
+
+AXES = 'xyz'
+RAW = [f'mu_f{k}_{axis}_adf' for k in range(NRUNS) for axis in AXES]
+PROPERTIES = ['pol_l1_adf', 'pol_l2_adf', 'pol_l3_adf', 'pol_mean_adf',
+              'pol_aniso_adf']
+
+
+class CalculationError(RuntimeError):
+    """A single point that did not terminate normally"""
+
+
+class StandIn:
+    """Fake ADF: dipoles μ0 + α F (+ a small F² term) of random atoms
+
+    Every system has its own reproducible atoms and tensors; `work` seconds
+    of CPU are burnt per single point and a fraction `failure_rate` of the
+    runs fails, to exercise the scheduler.
+    """
+    SYMBOLS = np.array(['H', 'C', 'N', 'O'])
+
+    def __init__(self, work=0.0, failure_rate=0.0, natoms=(2, 40), seed=0):
+        self.work = work
+        self.failure_rate = failure_rate
+        self.natoms = natoms
+        self.seed = seed
+
+    def __call__(self, system, field):
+        if np.random.default_rng().random() < self.failure_rate:
+            raise CalculationError(f"{system}: SCF did not converge (stand-in)")
+        rng = np.random.default_rng([self.seed, zlib.crc32(system.encode())])
+        n = int(rng.integers(*self.natoms))
+        symbols = self.SYMBOLS[rng.integers(len(self.SYMBOLS), size=n)]
+        A = rng.normal(size=(n, 3, 3))
+        alpha = A @ np.swapaxes(A, 1, 2) + 2*np.eye(3)
+        mu0 = rng.normal(scale=0.1, size=(n, 3))
+        field = np.asarray(field, dtype=float)
+        dipoles = mu0 + alpha @ field + 0.5*field @ field
+        end = time.process_time() + self.work
+        while time.process_time() < end:
+            np.linalg.eigvalsh(alpha)
+        return symbols.tolist(), dipoles
+
+
+def single_point(calculator, system, run, field=FIELD):
+    """One field-perturbed job: (symbols, dipoles, seconds)"""
+    start = time.perf_counter()
+    symbols, dipoles = calculator(system, field*FIELDS[run])
+    dipoles = np.asarray(dipoles, dtype=float).reshape(len(symbols), 3)
+    return symbols, dipoles, time.perf_counter() - start
+
+
+def create(conn):
+    """Tables of the output database (if missing)"""
+    conn.execute("CREATE TABLE IF NOT EXISTS systems (system_id INTEGER PRIMARY KEY, "
+                 "system TEXT UNIQUE, natoms INTEGER, normal_termination INTEGER, "
+                 "aimall INTEGER, attempts INTEGER, time REAL)")
+    conn.execute("CREATE TABLE IF NOT EXISTS atoms (atom_id INTEGER PRIMARY KEY, "
+                 "system_id INTEGER NOT NULL REFERENCES systems(system_id), "
+                 "symbol TEXT, mu_adf_norm REAL, "
+                 + ", ".join(f"{col} REAL" for col in PROPERTIES + RAW) + ")")
+    conn.execute("CREATE INDEX IF NOT EXISTS atoms_system ON atoms(system_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS atoms_symbol ON atoms(symbol, system_id)")
+    conn.commit()
+
+
+def write(conn, finished, failed, field=FIELD):
+    """Insert finished systems (derivatives of all of them at once) and failures"""
+    with conn:
+        for system, (runs, attempts, seconds) in failed.items():
+            conn.execute("DELETE FROM systems WHERE system = ?", (system,))
+            conn.execute("INSERT INTO systems (system, natoms, normal_termination, "
+                         "aimall, attempts, time) VALUES (?, NULL, ?, 0, ?, ?)",
+                         (system, runs, attempts, seconds))
+        if not finished:
+            return
+        # (atoms of every system, 7, 3) -> tensors -> properties in one call
+        dipoles = np.concatenate([np.stack([r[1] for r in runs], axis=1)
+                                  for runs, _, _ in finished.values()])
+        props = from_dipoles(dipoles, field)
+        values = np.column_stack([np.linalg.norm(dipoles[:, 0], axis=1)]
+                                 + [props[col] for col in PROPERTIES]
+                                 + [dipoles.reshape(len(dipoles), -1)])
+        start = 0
+        names = ", ".join(['mu_adf_norm'] + PROPERTIES + RAW)
+        marks = ", ".join('?'*(2 + 1 + len(PROPERTIES) + len(RAW)))
+        for system, (runs, attempts, seconds) in finished.items():
+            symbols = runs[0][0]
+            conn.execute("DELETE FROM systems WHERE system = ?", (system,))
+            system_id = conn.execute(
+                "INSERT INTO systems (system, natoms, normal_termination, aimall, "
+                "attempts, time) VALUES (?, ?, ?, 0, ?, ?)",
+                (system, len(symbols), NRUNS, attempts, seconds)).lastrowid
+            rows = values[start:start + len(symbols)].tolist()
+            conn.executemany(f"INSERT INTO atoms (system_id, symbol, {names}) "
+                             f"VALUES ({marks})",
+                             [(system_id, s, *row) for s, row in zip(symbols, rows)])
+            start += len(symbols)
+
+
+def schedule(systems, calculator, database, workers=None, retries=2, field=FIELD,
+             commit_every=50, pending=None):
+    """Run the workflow of every system, returns a throughput report
+
+    At most `pending` single points (4 per worker by default) are queued at
+    a time; a run failing more than `retries` times makes its system fail.
+    """
+    conn = sqlite3.connect(database)
+    create(conn)
+    complete = {row[0] for row in conn.execute(
+        "SELECT system FROM systems WHERE normal_termination = ?", (NRUNS,))}
+    todo = (system for system in systems if system not in complete)
+    jobs = ((system, run) for system in todo for run in range(NRUNS))
+    retry = deque()
+
+    workers = workers or os.cpu_count()
+    pending = pending or 4*workers
+    runs, attempts, seconds, failures = {}, {}, {}, {}
+    finished, failed, dead = {}, {}, set()
+    report = {'systems': 0, 'failed': 0, 'jobs': 0, 'retries': 0, 'busy': 0.0}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(workers) as pool:
+        futures = {}
+        while True:
+            while len(futures) < pending:
+                job = retry.popleft() if retry else next(jobs, None)
+                if job is None:
+                    break
+                system, run = job
+                if system in dead:
+                    continue
+                runs.setdefault(system, [None]*NRUNS)
+                attempts[system] = attempts.get(system, 0) + 1
+                futures[pool.submit(single_point, calculator, system, run, field)] = job
+            if not futures:
+                break
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                system, run = futures.pop(future)
+                if system in dead:
+                    continue
+                try:
+                    symbols, dipoles, elapsed = future.result()
+                except Exception:
+                    failures[system, run] = failures.get((system, run), 0) + 1
+                    if failures[system, run] <= retries:
+                        report['retries'] += 1
+                        retry.append((system, run))
+                        continue
+                    dead.add(system)
+                    failures.pop((system, run))
+                    ok = sum(r is not None for r in runs.pop(system))
+                    failed[system] = (ok, attempts.pop(system), seconds.pop(system, 0.0))
+                    continue
+                report['jobs'] += 1
+                report['busy'] += elapsed
+                seconds[system] = seconds.get(system, 0.0) + elapsed
+                runs[system][run] = (symbols, dipoles)
+                failures.pop((system, run), None)
+                if all(r is not None for r in runs[system]):
+                    finished[system] = (runs.pop(system), attempts.pop(system),
+                                        seconds.pop(system))
+            if len(finished) + len(failed) >= commit_every:
+                write(conn, finished, failed, field)
+                report['systems'] += len(finished)
+                report['failed'] += len(failed)
+                finished, failed = {}, {}
+    write(conn, finished, failed, field)
+    report['systems'] += len(finished)
+    report['failed'] += len(failed)
+    conn.close()
+
+    report['wall'] = time.perf_counter() - start
+    report['workers'] = workers
+    report['utilisation'] = report['busy']/(report['wall']*workers) if report['wall'] else 0
+    return report
+
+
+def load_calculator(spec, **kwargs):
+    """Calculator class from 'module:Class' (StandIn by default)"""
+    if not spec:
+        return StandIn(**kwargs)
+    module, name = spec.split(':')
+    return getattr(importlib.import_module(module), name)()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('database', help="output database (created or continued)")
+    parser.add_argument('--systems', type=int, default=100,
+                        help="number of stand-in systems (sys_0, sys_1, ...)")
+    parser.add_argument('--names', help="file with one system name per line")
+    parser.add_argument('--calculator', help="module:Class of a real calculator")
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--retries', type=int, default=2)
+    parser.add_argument('--pending', type=int, help="queued single points (4 per worker)")
+    parser.add_argument('--commit-every', type=int, default=50)
+    parser.add_argument('--work', type=float, default=0.0,
+                        help="CPU seconds per stand-in single point")
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.names:
+        with open(args.names) as f:
+            systems = [line.strip() for line in f if line.strip()]
+    else:
+        systems = (f"sys_{i}" for i in range(args.systems))
+    calculator = load_calculator(args.calculator, work=args.work,
+                                 failure_rate=args.failure_rate)
+    r = schedule(systems, calculator, args.database, args.workers, args.retries,
+                 commit_every=args.commit_every, pending=args.pending)
+    print(f"{r['systems']} systems written, {r['failed']} failed, {r['jobs']} single "
+          f"points ({r['retries']} retried) in {r['wall']:.2f} s: "
+          f"{r['jobs']/r['wall']:.1f} jobs/s, {r['workers']} workers "
+          f"{100*r['utilisation']:.0f} % busy")
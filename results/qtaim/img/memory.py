@@ -1,18 +1,24 @@
 #!/usr/bin/python3
+# Memory allocated for the critical points (maxCP) by the different models.
+#
+# Usage: ./memory.py                          comparison plot
+#        ./memory.py --plan q_dp_pol.db ...   predicted memory of a dataset
+#        (matplotlib and scipy are only imported when needed, see analysis.py
+#        memory-model)
+import sys
 import math
 import numpy as np
-import matplotlib.pyplot as plt
 
 def compute_maxCP(natoms):
     """Theoretical maximum CP"""
     return natoms*(natoms-1) + natoms*(natoms-3)/2 + 6*natoms - 23
 
-def castor_implementation(x):
+def castor_implementation(x, a=50, s=50):
     """Square root with exponential decay"""
-    return 50*np.sqrt(x)*(1 - np.exp(-x/50))
+    return a*np.sqrt(x)*(1 - np.exp(-x/s))
 
-def rodrigez_implementation(x):
-    return 256*x
+def rodrigez_implementation(x, k=256):
+    return k*x
 
 # Precompute anchor values for continuity
 f1_at_59 = 59*(59-1)/2 + 59/2 + 59/3
@@ -20,42 +26,53 @@ f2_at_136 = f1_at_59 + 500*math.erf((136 - 59)/50)
 
 def compute_maxCP_smooth(natoms, k1=0.1, D3=50, C=50, D=5):
     """Smooth version of compute_maxCP with blended transitions"""
+    from scipy.special import erf
+    natoms = np.asarray(natoms, dtype=float)
     # Stage curves
     f1 = natoms*(natoms-1)/2 + natoms/2 + natoms/3
-    f2 = f1_at_59 + 500*math.erf((natoms - 59)/50)
-    f3 = f2_at_136 + C*math.log1p(max(natoms - 136, 0)/D)
+    f2 = f1_at_59 + 500*erf((natoms - 59)/50)
+    f3 = f2_at_136 + C*np.log1p(np.maximum(natoms - 136, 0)/D)
 
     # First transition: logistic around 59
-    w1 = 1.0/(1.0 + math.exp(-k1*(natoms - 59)))
+    w1 = 1.0/(1.0 + np.exp(-k1*(natoms - 59)))
     mid = (1 - w1)*f1 + w1*f2
 
     # Second transition: arcsin-based smoothstep in [136, 136+D3]
+    # (u clipped to [-1, 1] gives w2 = 0 before 136 and 1 after 136+D3)
     x = natoms - 136
-    if x <= 0:
-        w2 = 0.0
-    elif x >= D3:
-        w2 = 1.0
-    else:
-        u = 2*x/D3 - 1
-        w2 = (math.asin(u) + math.pi/2) / math.pi
+    u = np.clip(2*x/D3 - 1, -1, 1)
+    w2 = (np.arcsin(u) + np.pi/2) / np.pi
 
-    return int((1 - w2)*mid + w2*f3)
+    return np.trunc((1 - w2)*mid + w2*f3).astype(np.int64)[()]
 
-def modified_sqrt_function(x):
+def modified_sqrt_function(x, a=5, s=1):
     """Modified square root function"""
-    return 5*np.sqrt(100*x)*(1 - np.exp(-x))
+    return a*np.sqrt(100*x)*(1 - np.exp(-x/s))
+
+def model_memory(natoms):
+    """Memory of every model [in MB] for an array of number of atoms"""
+    natoms = np.asarray(natoms, dtype=float)
+    return {
+        'Limit of maxCP': 26*compute_maxCP(natoms)/1024,
+        'Current Implementation': 26*castor_implementation(natoms)/1024,
+        'Original Implementation': 27*rodrigez_implementation(natoms)/1024,
+        'Function defined by parts': 26*compute_maxCP_smooth(natoms)/1024,
+        '√n function with exponential decay': 26*np.trunc(modified_sqrt_function(natoms))/1024,
+    }
 
 def create_plot(use_log_scale=False):
     """Create the growth functions comparison plot"""
+    import matplotlib.pyplot as plt
     # Generate input values
     x_vals = np.linspace(1, 600, 600)
     
     # Calculate function values [in MB]
-    theoretical = [26*compute_maxCP(x)/1024 for x in x_vals]
-    smooth_vals = [26*compute_maxCP_smooth(x)/1024 for x in x_vals]
-    castor_vals = [26*castor_implementation(x)/1024 for x in x_vals]
-    mod_sqrt_vals = [26*int(modified_sqrt_function(x))/1024 for x in x_vals]
-    rodriguez_vals = [27*rodrigez_implementation(x)/1024 for x in x_vals]
+    memory = model_memory(x_vals)
+    theoretical = memory['Limit of maxCP']
+    smooth_vals = memory['Function defined by parts']
+    castor_vals = memory['Current Implementation']
+    mod_sqrt_vals = memory['√n function with exponential decay']
+    rodriguez_vals = memory['Original Implementation']
 
     # Create the plot
     plt.figure(figsize=(12, 8))
@@ -84,9 +101,68 @@ def create_plot(use_log_scale=False):
     plt.tight_layout()
     return plt
 
+def read_natoms(databases, where=None):
+    """natoms of every system of the databases (paths or glob patterns)"""
+    from shards import connect, expand
+    natoms = []
+    for path in expand(databases):
+        conn = connect(path)
+        query = "SELECT natoms FROM systems" + (f" WHERE {where}" if where else "")
+        natoms.append(np.array(conn.execute(query).fetchall(), dtype=np.int64).ravel())
+        conn.close()
+    return np.concatenate(natoms) if natoms else np.empty(0, dtype=np.int64)
+
+def plan_memory(natoms):
+    """Total, peak and mean predicted memory [MB] of every model over a dataset
+
+    Each model is evaluated once per distinct number of atoms and weighted by
+    how many systems have it.
+    """
+    sizes, counts = np.unique(natoms, return_counts=True)
+    plan = {}
+    for label, values in model_memory(sizes).items():
+        total = np.sum(values*counts)
+        plan[label] = {'values': values, 'total': total, 'peak': values.max(),
+                       'mean': total/counts.sum()}
+    return sizes, counts, plan
+
+def plot_plan(counts, plan, filename='memory_plan.pdf'):
+    """Histogram of the predicted memory per system for every model"""
+    import matplotlib.pyplot as plt
+    colours = ['b', 'g', 'c', 'r', 'm']
+    allvalues = np.concatenate([p['values'] for p in plan.values()])
+    low = max(allvalues[allvalues > 0].min(), 1e-3)
+    bins = np.logspace(np.log10(low), np.log10(allvalues.max()), 60)
+
+    plt.figure(figsize=(12, 8))
+    for (label, p), colour in zip(plan.items(), colours):
+        plt.hist(p['values'], bins=bins, weights=counts, histtype='step',
+                 color=colour, linewidth=2, label=label)
+    plt.xscale('log')
+    plt.xlabel("maxCP per system in MB (log scale)", fontsize=18, fontweight='bold')
+    plt.ylabel("number of systems", fontsize=18, fontweight='bold')
+    plt.title("Predicted allocation memory of the dataset", fontsize=20, fontweight='bold')
+    plt.grid(True, alpha=0.3)
+    plt.legend(loc='upper right', frameon=True, fancybox=True, shadow=True,
+           fontsize=14, framealpha=0.9)
+    plt.tight_layout()
+    plt.savefig(filename)
+
+def report(natoms, plan):
+    print(f"=== PREDICTED maxCP MEMORY ({len(natoms)} systems, "
+          f"{natoms.min()}-{natoms.max()} atoms) ===")
+    for label, p in plan.items():
+        print(f"{label:<36} Total: {p['total']:14.1f} MB, "
+              f"Peak: {p['peak']:10.1f} MB, Mean: {p['mean']:8.2f} MB")
+
 # Main execution
 if __name__ == "__main__":
-    # Create log scale plot
-    plot2 = create_plot(use_log_scale=True)
-    plt.savefig('memory_optimisation_curve.pdf')
-
+    if len(sys.argv) > 2 and sys.argv[1] == '--plan':
+        natoms = read_natoms(sys.argv[2:])
+        sizes, counts, plan = plan_memory(natoms)
+        report(natoms, plan)
+        plot_plan(counts, plan)
+    else:
+        # Create log scale plot
+        plot2 = create_plot(use_log_scale=True)
+        plot2.savefig('memory_optimisation_curve.pdf')
@@ -0,0 +1,87 @@
+#!/usr/bin/python3
+# Convert a QTAIM database with one table per system into the long layout:
+#
+#   systems(system_id INTEGER PRIMARY KEY, system, natoms, normal_termination, aimall, ...)
+#   atoms(atom_id INTEGER PRIMARY KEY, system_id -> systems, symbol, mu_*..., pol_*...)
+#
+# with indexes on the element and on the filter flags, so the analyses can
+# run one indexed query over the whole dataset instead of one per system.
+#
+# Usage: ./migrate_atoms.py q_dp_pol.db q_dp_pol_atoms.db
+import os
+import sys
+import sqlite3
+from qtaim_db import quote
+
+# Columns copied from the per-system tables
+PREFIXES = ('mu_', 'pol_')
+
+
+def table_info(conn, table, schema='src'):
+    """(name, declared type) of the columns of a table"""
+    return [(row[1], row[2]) for row in
+            conn.execute(f"PRAGMA {schema}.table_info({quote(table)})")]
+
+
+def index(conn, symbol=True, system_cols=('normal_termination', 'aimall')):
+    """Indexes for the usual access paths: per system, per element, flags"""
+    conn.execute("CREATE INDEX atoms_system ON atoms(system_id)")
+    if symbol:
+        conn.execute("CREATE INDEX atoms_symbol ON atoms(symbol, system_id)")
+    flags = [c for c in ('normal_termination', 'aimall') if c in system_cols]
+    if flags:
+        conn.execute("CREATE INDEX systems_flags ON systems("
+                     + ", ".join(flags) + ", system_id)")
+    conn.execute("ANALYZE")
+    conn.commit()
+
+
+def migrate(source, target):
+    """Write the long layout of `source` into the new database `target`"""
+    if os.path.exists(target):
+        raise FileExistsError(f"{target} already exists, not overwriting it")
+    conn = sqlite3.connect(target)
+    conn.execute("ATTACH DATABASE ? AS src", (source,))
+
+    # Systems keep their columns, the rowid becomes the system_id
+    sys_cols = table_info(conn, 'systems')
+    conn.execute("CREATE TABLE systems (system_id INTEGER PRIMARY KEY, "
+                 + ", ".join(f"{quote(c)} {t}" for c, t in sys_cols) + ")")
+    conn.execute("INSERT INTO systems SELECT rowid, * FROM src.systems ORDER BY rowid")
+    systems = conn.execute("SELECT system_id, system FROM systems").fetchall()
+
+    # Union of the atomic columns found in the system tables (first seen order)
+    atom_cols, tables = {}, []
+    for system_id, system in systems:
+        cols = [(c, t) for c, t in table_info(conn, system)
+                if c == 'symbol' or c.startswith(PREFIXES)]
+        if not cols:
+            print(f"Skipping {system}: no such table or no atomic columns")
+            continue
+        for c, t in cols:
+            atom_cols.setdefault(c, t)
+        tables.append((system_id, system, [c for c, _ in cols]))
+    conn.execute("CREATE TABLE atoms (atom_id INTEGER PRIMARY KEY, "
+                 "system_id INTEGER NOT NULL REFERENCES systems(system_id), "
+                 + ", ".join(f"{quote(c)} {t}" for c, t in atom_cols.items()) + ")")
+
+    # Copy system by system (inside SQLite, one transaction)
+    with conn:
+        for system_id, system, cols in tables:
+            names = ", ".join(quote(c) for c in cols)
+            conn.execute(f"INSERT INTO atoms (system_id, {names}) "
+                         f"SELECT ?, {names} FROM src.{quote(system)}", (system_id,))
+
+    index(conn, 'symbol' in atom_cols, [c for c, _ in sys_cols])
+
+    natoms = conn.execute("SELECT COUNT(*) FROM atoms").fetchone()[0]
+    conn.execute("DETACH DATABASE src")
+    conn.close()
+    return len(tables), natoms
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit(f"Usage: {sys.argv[0]} <per-system database> <new long database>")
+    nsystems, natoms = migrate(sys.argv[1], sys.argv[2])
+    print(f"{nsystems} systems and {natoms} atoms written to {sys.argv[2]}")
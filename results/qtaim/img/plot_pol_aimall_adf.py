@@ -1,101 +1,95 @@
 #!/usr/bin/python3
-import sqlite3
+# Usage: ./plot_pol_aimall_adf.py [pol_150.db ...]
+#        statistics() and report() only need NumPy and sqlite3, the plotting
+#        stack is imported by plot() (see analysis.py pol-stats)
+import sys
 import numpy as np
-import seaborn as sns
-import matplotlib.pyplot as plt
-import matplotlib.ticker as mticker
+from shards import accumulate
+from differences import POL_COLUMNS, POL_LABELS, polarisability_differences
 
 # Common style configuration
 def setup_plot_style():
+    import seaborn as sns
+    import matplotlib.pyplot as plt
     sns.set_style("whitegrid")
     plt.rcParams.update({'font.size': 14})
 
-# Connect to the database
-conn = sqlite3.connect('/Users/vcastor/Documents/PhD_Rouen/polarizability/ML/pol_150.db')
-c = conn.cursor()
-
-# Query to know the systems in the database
-c.execute('''SELECT system FROM systems''')
-systems = c.fetchall()
-
-# Loop for querying the polarisabilities for every system
-meanp, lambda1, lambda2, lambda3 = [], [], [], []
-for system in systems:
-    system = system[0]
-    c.execute(f'''SELECT pol_l1_adf, pol_l2_adf, pol_l3_adf, pol_mean_adf,
-                         pol_l1_aimall, pol_l2_aimall, pol_l3_aimall, pol_mean_aimall
-                  FROM {system}''')
-    pols = c.fetchall()
-    pols = np.array(pols)
-    pols[np.isnan(pols)] = 0
-    # Calculate the differences
-    if pols.shape[0] > 0:
-        diff = pols[:,:4] - pols[:,4:]
-        meanp.extend(diff[:,3])
-        lambda1.extend(diff[:,0])
-        lambda2.extend(diff[:,1])
-        lambda3.extend(diff[:,2])
-
-conn.close()
-
-# Convert the lists to NumPy arrays
-meanp = np.array(meanp).flatten()
-lambda1 = np.array(lambda1).flatten()
-lambda2 = np.array(lambda2).flatten()
-lambda3 = np.array(lambda3).flatten()
-
-# Print statistics
-print("=== POLARIZABILITY DIFFERENCES STATISTICS ===")
-print(f"Mean polarisability - Mean: {np.mean(meanp):.4f}, Std: {np.std(meanp):.4f}, Median: {np.median(meanp):.4f}, Count: {len(meanp)}")
-print(f"Lambda 1 - Mean: {np.mean(lambda1):.4f}, Std: {np.std(lambda1):.4f}, Median: {np.median(lambda1):.4f}, Count: {len(lambda1)}")
-print(f"Lambda 2 - Mean: {np.mean(lambda2):.4f}, Std: {np.std(lambda2):.4f}, Median: {np.median(lambda2):.4f}, Count: {len(lambda2)}")
-print(f"Lambda 3 - Mean: {np.mean(lambda3):.4f}, Std: {np.std(lambda3):.4f}, Median: {np.median(lambda3):.4f}, Count: {len(lambda3)}")
-
-# Set up the plotting style
-setup_plot_style()
-
-# Create the plot
-plt.figure(figsize=(12, 8))
-
 # Define colors (same palette as dipole moments)
 colours = ['#2E86AB', '#A23B72', '#F18F01', '#6A994E']  # Blue, Purple, Orange, Green ! COLOUR !
-labels = ['Mean', 'λ1', 'λ2', 'λ3']
+labels = POL_LABELS
 
-# Plot histograms with transparency and higher resolution
+# Histogram grid, the counts are accumulated while reading the database
 bins = np.linspace(-5, 5, 100)  # More bins for smoother curves
 kde_params = {'bw_adjust': 1.2, 'bw_method': 'silverman'}  # Slightly smoother KDE
 
-sns.histplot(meanp, kde=False, stat="count", alpha=0.4,
-             color=colours[0], label=labels[0], bins=bins,
-             kde_kws=kde_params)
-sns.histplot(lambda1, kde=False, stat="count", alpha=0.4,
-             color=colours[1], label=labels[1], bins=bins,
-             kde_kws=kde_params)
-sns.histplot(lambda2, kde=False, stat="count", alpha=0.4,
-             color=colours[2], label=labels[2], bins=bins,
-             kde_kws=kde_params)
-sns.histplot(lambda3, kde=False, stat="count", alpha=0.4,
-             color=colours[3], label=labels[3], bins=bins,
-             kde_kws=kde_params)
-
-# Customize the plot
-plt.xlabel("Polarisability Difference (ADF - AIMAll) (a.u.)", fontsize=16, fontweight='bold')
-plt.ylabel("Count (×10²)", fontsize=16, fontweight='bold')
-plt.title("Distribution of Atomic Polarisability Differences",
-          fontsize=18, fontweight='bold', pad=20)
-
-# Set axis limits and formatting
-plt.xlim(-3.5, 3.5)
-plt.gca().yaxis.set_major_formatter(mticker.FuncFormatter(lambda x, _: f'{x*1e-2:.0f}'))
-
-# Add enhanced legend with highlighted rectangle
-plt.legend(loc='upper right', frameon=True, fancybox=True, shadow=True,
-           fontsize=14, framealpha=0.9)
-
-# Add grid customization
-plt.grid(True, alpha=0.3)
-
-# Adjust layout and save
-plt.tight_layout()
-plt.savefig("histogram_polarisability.pdf", dpi=300, bbox_inches='tight')
-
+# Database of the thesis, used when none is given
+DATABASE = '/Users/vcastor/Documents/PhD_Rouen/polarizability/ML/pol_150.db'
+
+def statistics(databases, cache=".qtaim_cache", workers=None):
+    """StreamStats of the mean polarisability and λ1, λ2, λ3 differences
+
+    Databases are paths or glob patterns, the system tables are shared out
+    among one process per core. The extracted columns are cached in `cache`
+    until the databases change. Returns the statistics and the number of
+    systems.
+    """
+    return accumulate(databases, POL_COLUMNS, polarisability_differences,
+                      len(labels), bins, workers=workers, cache=cache)
+
+def report(stats):
+    meanp, lambda1, lambda2, lambda3 = stats
+
+    # Print statistics (median from the quantile sketch, 0.1% relative error)
+    print("=== POLARIZABILITY DIFFERENCES STATISTICS ===")
+    print(f"Mean polarisability - Mean: {meanp.mean:.4f}, Std: {meanp.std:.4f}, Median: {meanp.median:.4f}, Count: {meanp.n}")
+    print(f"Lambda 1 - Mean: {lambda1.mean:.4f}, Std: {lambda1.std:.4f}, Median: {lambda1.median:.4f}, Count: {lambda1.n}")
+    print(f"Lambda 2 - Mean: {lambda2.mean:.4f}, Std: {lambda2.std:.4f}, Median: {lambda2.median:.4f}, Count: {lambda2.n}")
+    print(f"Lambda 3 - Mean: {lambda3.mean:.4f}, Std: {lambda3.std:.4f}, Median: {lambda3.median:.4f}, Count: {lambda3.n}")
+
+def plot(stats, filename="histogram_polarisability.pdf"):
+    import matplotlib.pyplot as plt
+    import matplotlib.ticker as mticker
+    from stream_stats import histplot_counts
+    meanp, lambda1, lambda2, lambda3 = stats
+
+    # Set up the plotting style
+    setup_plot_style()
+
+    # Create the plot
+    plt.figure(figsize=(12, 8))
+
+    # Plot the pre-binned histograms with transparency and their KDE (FFT)
+    histplot_counts(meanp, kde=True, stat="count", alpha=0.4,
+                    color=colours[0], label=labels[0], kde_kws=kde_params)
+    histplot_counts(lambda1, kde=True, stat="count", alpha=0.4,
+                    color=colours[1], label=labels[1], kde_kws=kde_params)
+    histplot_counts(lambda2, kde=True, stat="count", alpha=0.4,
+                    color=colours[2], label=labels[2], kde_kws=kde_params)
+    histplot_counts(lambda3, kde=True, stat="count", alpha=0.4,
+                    color=colours[3], label=labels[3], kde_kws=kde_params)
+
+    # Customize the plot
+    plt.xlabel("Polarisability Difference (ADF - AIMAll) (a.u.)", fontsize=16, fontweight='bold')
+    plt.ylabel("Count (×10²)", fontsize=16, fontweight='bold')
+    plt.title("Distribution of Atomic Polarisability Differences",
+              fontsize=18, fontweight='bold', pad=20)
+
+    # Set axis limits and formatting
+    plt.xlim(-3.5, 3.5)
+    plt.gca().yaxis.set_major_formatter(mticker.FuncFormatter(lambda x, _: f'{x*1e-2:.0f}'))
+
+    # Add enhanced legend with highlighted rectangle
+    plt.legend(loc='upper right', frameon=True, fancybox=True, shadow=True,
+               fontsize=14, framealpha=0.9)
+
+    # Add grid customization
+    plt.grid(True, alpha=0.3)
+
+    # Adjust layout and save
+    plt.tight_layout()
+    plt.savefig(filename, dpi=300, bbox_inches='tight')
+
+if __name__ == "__main__":
+    stats, _ = statistics(sys.argv[1:] or [DATABASE])
+    report(stats)
+    plot(stats)
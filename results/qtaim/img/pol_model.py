@@ -0,0 +1,226 @@
+#!/usr/bin/python3
+# Out-of-core models of the atomic polarisabilities of the QTAIM databases
+#
+# The ADF polarisability (pol_mean_adf by default) is predicted from the
+# AIMAll ones and the element. Features and targets are streamed chunk by
+# chunk from the databases (shards.plan / task_chunks) and the models are
+# trained with partial_fit, so memory stays bounded whatever the size of the
+# data: a StandardScaler pass first, then `epochs` passes of SGDRegressor,
+# on the raw features ('sgd') or on random Fourier features of them ('rff').
+#
+# Cross-validation is grouped by system (every atom of a system falls in the
+# same fold) and every fold is trained by its own worker process. The state
+# of every fold is checkpointed after each epoch and an interrupted run
+# resumes from there.
+#
+# Usage: ./pol_model.py pol_150.db [--target pol_mean_adf] [--model rff]
+#                       [--folds 5] [--epochs 5] [--workers 4]
+import os
+import zlib
+import pickle
+import argparse
+import numpy as np
+from contextlib import ExitStack
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.linear_model import SGDRegressor
+from sklearn.preprocessing import StandardScaler
+from sklearn.kernel_approximation import RBFSampler
+from shards import connect, expand, plan, task_chunks
+from qtaim_db import system_names
+
+FEATURES = ['pol_l1_aimall', 'pol_l2_aimall', 'pol_l3_aimall', 'pol_mean_aimall']
+TARGET = 'pol_mean_adf'
+# One-hot element columns (anything else goes to a last column)
+ELEMENTS = ("H He Li Be B C N O F Ne Na Mg Al Si P S Cl Ar K Ca Sc Ti V Cr Mn "
+            "Fe Co Ni Cu Zn Ga Ge As Se Br Kr Rb Sr Y Zr Nb Mo Tc Ru Rh Pd Ag "
+            "Cd In Sn Sb Te I Xe").split()
+INDEX = {symbol: i for i, symbol in enumerate(ELEMENTS)}
+
+# Hash of the system name of every 'system' key, per (database, where)
+_names = {}
+
+
+def design(chunk, features=FEATURES, target=TARGET):
+    """Feature matrix, target and system key of the complete rows of a chunk"""
+    uniques, codes = np.unique(chunk['symbol'].astype(str), return_inverse=True)
+    element = np.array([INDEX.get(s, len(ELEMENTS)) for s in uniques],
+                       dtype=np.int64)[codes.ravel()]
+    numeric = np.column_stack([chunk[col] for col in features])
+    y = chunk[target]
+    ok = np.isfinite(numeric).all(axis=1) & np.isfinite(y)
+    X = np.zeros((ok.sum(), len(features) + len(ELEMENTS) + 1))
+    X[:, :len(features)] = numeric[ok]
+    X[np.arange(len(X)), len(features) + element[ok]] = 1
+    return X, y[ok], chunk['system'][ok]
+
+
+def name_hashes(path, where=None):
+    """crc32 of the system name, indexed by the 'system' key of the database
+
+    `where` is the filter the keys were planned with (shards.plan): in the
+    wide layout the key is the index among the selected systems only.
+    """
+    if (path, where) not in _names:
+        conn = connect(path)
+        names = system_names(conn, where)
+        conn.close()
+        hashes = np.zeros(max(names, default=-1) + 1, dtype=np.uint64)
+        for key, name in names.items():
+            hashes[key] = zlib.crc32(name.encode())
+        _names[path, where] = hashes
+    return _names[path, where]
+
+
+def folds_of(path, systems, nfolds, where=None):
+    """Fold of every system key of a database (planned with `where`)
+
+    The fold follows from the system name, so it is the same across runs,
+    batch sizes and layouts (the keys are indices or system_id).
+    """
+    h = name_hashes(path, where)[systems]*np.uint64(0x9E3779B97F4A7C15)
+    return ((h >> np.uint64(33)) % np.uint64(nfolds)).astype(np.int64)
+
+
+def stream(tasks, config, fold=None, train=True):
+    """(X, y) batches of the training (or held-out) rows of `fold`
+
+    fold=None gives every row. Rows are shuffled within each chunk.
+    """
+    columns = config['features'] + [config['target'], 'symbol']
+    rng = np.random.default_rng(config['seed'])
+    for task in tasks:
+        for chunk in task_chunks(task, columns):
+            X, y, systems = design(chunk, config['features'], config['target'])
+            if fold is not None:
+                folds = folds_of(task[0], systems, config['folds'], config.get('where'))
+                keep = (folds != fold) == train
+                X, y = X[keep], y[keep]
+            if len(y):
+                order = rng.permutation(len(y))
+                yield X[order], y[order]
+
+
+def new_state(config, nfeatures):
+    """Untrained scaler, feature map and regressor"""
+    features = None
+    if config['model'] == 'rff':
+        # Random weights only depend on the dimension and the seed
+        features = RBFSampler(gamma=config['gamma'], n_components=config['components'],
+                              random_state=config['seed']).fit(np.zeros((1, nfeatures)))
+    model = SGDRegressor(alpha=config['alpha'], learning_rate='invscaling',
+                         eta0=config['eta0'], random_state=config['seed'])
+    return {'config': config, 'epoch': -1, 'scaler': StandardScaler(),
+            'features': features, 'model': model}
+
+
+def transform(state, X):
+    X = state['scaler'].transform(X)
+    return state['features'].transform(X) if state['features'] is not None else X
+
+
+def save(state, filename):
+    # Atomic replace: an interrupted write never leaves a broken checkpoint
+    with open(filename + '.tmp', 'wb') as f:
+        pickle.dump(state, f)
+    os.replace(filename + '.tmp', filename)
+
+
+def restore(filename, config):
+    """Checkpointed state of the same configuration (but epochs), or None"""
+    try:
+        with open(filename, 'rb') as f:
+            state = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+    if dict(state['config'], epochs=None) != dict(config, epochs=None):
+        return None
+    # More epochs continue the same training
+    state['config'] = config
+    return state
+
+
+def train(tasks, config, fold=None, checkpoint=None):
+    """Train on the rows out of `fold` (all with None), epoch 0 fits the scaler"""
+    state = restore(checkpoint, config) if checkpoint else None
+    nfeatures = len(config['features']) + len(ELEMENTS) + 1
+    state = state or new_state(config, nfeatures)
+    for epoch in range(state['epoch'] + 1, config['epochs'] + 1):
+        for X, y in stream(tasks, dict(config, seed=config['seed'] + epoch), fold):
+            if epoch == 0:
+                state['scaler'].partial_fit(X)
+            else:
+                state['model'].partial_fit(transform(state, X), y)
+        state['epoch'] = epoch
+        if checkpoint:
+            save(state, checkpoint)
+    return state
+
+
+def score(state, tasks, fold=None):
+    """MAE, RMSE and R² on the held-out rows of `fold`, accumulated by chunk"""
+    n = sy = syy = sse = sae = 0.0
+    for X, y in stream(tasks, state['config'], fold, train=False):
+        error = state['model'].predict(transform(state, X)) - y
+        n += len(y)
+        sy += y.sum()
+        syy += y @ y
+        sse += error @ error
+        sae += np.abs(error).sum()
+    return {'n': int(n), 'mae': sae/n, 'rmse': np.sqrt(sse/n),
+            'r2': 1 - sse/(syy - sy*sy/n)}
+
+
+def run_fold(tasks, config, fold, checkpoints):
+    """Train and score one fold (None: final model on every row)"""
+    name = 'final' if fold is None else f'fold{fold}'
+    checkpoint = os.path.join(checkpoints, f'{name}.pkl') if checkpoints else None
+    state = train(tasks, config, fold, checkpoint)
+    return name, score(state, tasks, fold)
+
+
+def cross_validate(databases, config, workers=None, checkpoints=None, final=True):
+    """Grouped K-fold scores (and the final model) with one process per fold"""
+    tasks = plan(expand(databases), config.get('where'))
+    if checkpoints:
+        os.makedirs(checkpoints, exist_ok=True)
+    folds = list(range(config['folds'])) + ([None] if final else [])
+    n = len(folds)
+    with ExitStack() as stack:
+        pool = stack.enter_context(ProcessPoolExecutor(workers)) if workers != 1 else None
+        return dict((pool.map if pool else map)(run_fold, [tasks]*n, [config]*n,
+                                                folds, [checkpoints]*n))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('databases', nargs='+', help="database files or globs")
+    parser.add_argument('--target', default=TARGET)
+    parser.add_argument('--features', nargs='+', default=FEATURES)
+    parser.add_argument('--where', help="filter on the systems table")
+    parser.add_argument('--model', choices=['sgd', 'rff'], default='sgd')
+    parser.add_argument('--components', type=int, default=500,
+                        help="random Fourier features (rff)")
+    parser.add_argument('--gamma', type=float, default=0.1, help="RBF gamma (rff)")
+    parser.add_argument('--alpha', type=float, default=1e-5)
+    parser.add_argument('--eta0', type=float, default=0.01)
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--epochs', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--checkpoints', default='.pol_model')
+    args = parser.parse_args()
+
+    config = {key: getattr(args, key) for key in
+              ('target', 'features', 'where', 'model', 'components', 'gamma',
+               'alpha', 'eta0', 'folds', 'epochs', 'seed')}
+    scores = cross_validate(args.databases, config, args.workers, args.checkpoints)
+    print(f"=== {args.model.upper()} MODEL OF {args.target} "
+          f"({args.folds}-fold, grouped by system) ===")
+    for name, s in scores.items():
+        kind = "training" if name == 'final' else "held-out"
+        print(f"{name:<7} {kind:<9} n: {s['n']:>9}  MAE: {s['mae']:.4f}  "
+              f"RMSE: {s['rmse']:.4f}  R²: {s['r2']:.4f}")
+    cv = [s for name, s in scores.items() if name != 'final']
+    print(f"CV mean  MAE: {np.mean([s['mae'] for s in cv]):.4f}  "
+          f"RMSE: {np.mean([s['rmse'] for s in cv]):.4f}  "
+          f"R²: {np.mean([s['r2'] for s in cv]):.4f}")
@@ -0,0 +1,69 @@
+#!/usr/bin/python3
+# Atomic polarisability tensors from the finite-field dipoles, all at once
+#
+# The seven single points of the workflow (plams_diagram.py) are stacked as
+# dipoles[..., run, i] in the order of FIELDS: no field, then +ε and -ε along
+# x, y and z. The tensors α_ij = ∂μ_i/∂F_j of any number of atoms (or
+# systems) come from one vectorized finite difference, are symmetrised as
+# Nye recommends and diagonalised with one batched eigvalsh.
+import numpy as np
+
+# Field strength [a.u.] of the perturbed runs
+FIELD = 0.005
+# Field direction of every run, in the order the dipoles are stacked
+FIELDS = np.array([[0, 0, 0],
+                   [1, 0, 0], [-1, 0, 0],
+                   [0, 1, 0], [0, -1, 0],
+                   [0, 0, 1], [0, 0, -1]])
+NRUNS = len(FIELDS)
+
+
+def tensors(dipoles, field=FIELD, scheme='central', symmetric=True):
+    """Polarisability tensors (..., 3, 3) from dipoles (..., 7, 3)
+
+    `scheme` is 'central' (μ(+ε) - μ(-ε))/2ε, 'forward' (μ(+ε) - μ(0))/ε or
+    'backward' (μ(0) - μ(-ε))/ε.
+    """
+    dipoles = np.asarray(dipoles, dtype=float)
+    zero = dipoles[..., 0, :]
+    plus, minus = dipoles[..., 1::2, :], dipoles[..., 2::2, :]
+    if scheme == 'central':
+        diff = (plus - minus)/(2*field)
+    elif scheme == 'forward':
+        diff = (plus - zero[..., None, :])/field
+    elif scheme == 'backward':
+        diff = (zero[..., None, :] - minus)/field
+    else:
+        raise ValueError(f"unknown scheme {scheme!r}")
+    # diff[..., j, i] = ∂μ_i/∂F_j
+    alpha = np.swapaxes(diff, -1, -2)
+    return symmetrise(alpha) if symmetric else alpha
+
+
+def symmetrise(alpha):
+    """(α + α^T)/2 of a stack of tensors"""
+    return 0.5*(alpha + np.swapaxes(alpha, -1, -2))
+
+
+def properties(alpha):
+    """λ1 ≤ λ2 ≤ λ3, mean and anisotropy of a stack of symmetric tensors"""
+    eig = np.linalg.eigvalsh(alpha)
+    l1, l2, l3 = np.moveaxis(eig, -1, 0)
+    aniso = np.sqrt(0.5*((l1 - l2)**2 + (l2 - l3)**2 + (l3 - l1)**2))
+    return {'l1': l1, 'l2': l2, 'l3': l3,
+            'mean': np.trace(alpha, axis1=-2, axis2=-1)/3, 'aniso': aniso}
+
+
+def columns(alpha, method='adf'):
+    """Properties named as the database columns (pol_l1_adf, ..., pol_mean_adf)
+
+    The tensors are symmetrised first: eigvalsh only reads the lower triangle,
+    so a raw tensors(..., symmetric=False) would give wrong eigenvalues.
+    """
+    alpha = symmetrise(alpha)
+    return {f'pol_{key}_{method}': value for key, value in properties(alpha).items()}
+
+
+def from_dipoles(dipoles, field=FIELD, method='adf', scheme='central'):
+    """Database columns of every atom from its seven dipoles (one call)"""
+    return columns(tensors(dipoles, field, scheme), method)
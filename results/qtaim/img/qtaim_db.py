@@ -0,0 +1,115 @@
+#!/usr/bin/python3
+# Extraction layer for the QTAIM databases (q_dp_pol.db, pol_150.db, ...)
+#
+# Every system lives in its own table and the `systems` table keeps the list
+# (with the `natoms`, `normal_termination` and `aimall` flags). Instead of one
+# SELECT per system, the tables are read in batches glued with UNION ALL and
+# the rows are streamed as chunks of NumPy arrays (shards.py reduces them).
+import numpy as np
+
+# SQLite refuses compound SELECTs with more than 500 terms (default build)
+BATCH = 250
+# Rows pulled from the cursor at once, the size of a chunk
+CHUNK = 65536
+
+
+def quote(name):
+    """Quote a table/column name for SQLite"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def list_systems(conn, where=None):
+    """Names of the system tables, optionally filtered (e.g. 'aimall = 1')"""
+    query = "SELECT system FROM systems"
+    if where:
+        query += f" WHERE {where}"
+    return [row[0] for row in conn.execute(query)]
+
+
+def batches(systems, batch=BATCH):
+    """Yield (offset, slice of systems) in groups of `batch` tables"""
+    for i in range(0, len(systems), batch):
+        yield i, systems[i:i + batch]
+
+
+def iter_columns(conn, systems, columns, symbol=None, text=('symbol',),
+                 batch=BATCH, chunk=CHUNK, offset=0):
+    """Stream `columns` of the `systems` tables in chunks of at most `chunk` rows
+
+    Yields one dict column -> array per chunk (float64, NULL -> nan; object
+    for the `text` columns) plus the key 'system' with the index of the table
+    every row comes from, so only a chunk of the database is in memory at a
+    time. `symbol` keeps only the atoms of that element. `offset` is the index
+    of systems[0] among all the systems, added to the 'system' key.
+    """
+    select = ", ".join(quote(col) for col in columns)
+    condition = "" if symbol is None else " WHERE symbol = ?"
+    for start, group in batches(systems, batch):
+        query = " UNION ALL ".join(
+            f"SELECT {offset + start + i}, {select} FROM {quote(s)}{condition}"
+            for i, s in enumerate(group))
+        params = [] if symbol is None else [symbol]*len(group)
+        yield from _chunks(conn.execute(query, params), columns, text, chunk)
+
+
+def _chunks(cursor, columns, text, chunk):
+    # (system, *columns) rows of a cursor to dicts of arrays
+    while True:
+        rows = cursor.fetchmany(chunk)
+        if not rows:
+            break
+        values = list(zip(*rows))
+        data = {'system': np.array(values[0], dtype=np.int64)}
+        for col, vals in zip(columns, values[1:]):
+            data[col] = np.array(vals, dtype=object if col in text else float)
+        yield data
+
+
+def system_names(conn, where=None):
+    """Mapping from the 'system' key of the extracted rows to the system name"""
+    if is_long(conn):
+        query = "SELECT system_id, system FROM systems"
+        if where:
+            query += f" WHERE {where}"
+        return dict(conn.execute(query))
+    return dict(enumerate(list_systems(conn, where)))
+
+
+# Long layout (see migrate_atoms.py): one `atoms` table with a `system_id`
+
+def is_long(conn):
+    """True for a database in the long layout (with an `atoms` table)"""
+    query = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'atoms'"
+    return conn.execute(query).fetchone() is not None
+
+
+def list_system_ids(conn, where=None):
+    """system_id of the systems, optionally filtered (e.g. 'aimall = 1')"""
+    query = "SELECT system_id FROM systems"
+    if where:
+        query += f" WHERE {where}"
+    return [row[0] for row in conn.execute(query + " ORDER BY system_id")]
+
+
+def iter_atoms(conn, columns, where=None, symbol=None, ids=None,
+               text=('symbol',), chunk=CHUNK):
+    """Stream `columns` of the `atoms` table with one (indexed) query
+
+    `where` filters on the systems columns, `symbol` on the element and `ids`
+    restricts to a list of system_id. The 'system' key holds the system_id.
+    """
+    select = ", ".join(f"atoms.{quote(col)}" for col in columns)
+    query = f"SELECT atoms.system_id, {select} FROM atoms"
+    conditions, params = [], []
+    if where:
+        query += " JOIN systems USING (system_id)"
+        conditions.append(f"({where})")
+    if symbol is not None:
+        conditions.append("atoms.symbol = ?")
+        params.append(symbol)
+    if ids is not None:
+        conditions.append(f"atoms.system_id IN ({', '.join('?'*len(ids))})")
+        params.extend(ids)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    yield from _chunks(conn.execute(query, params), columns, text, chunk)
@@ -0,0 +1,191 @@
+#!/usr/bin/python3
+# Process-parallel reduction over several (sharded) QTAIM databases
+#
+# The system tables of all the databases are split in tasks of `batch` tables.
+# Every task is reduced to fresh StreamStats by a worker with its own
+# read-only connection, and the partial accumulators are merged in task
+# order. A serial run goes through the very same tasks, so both give
+# identical statistics and histograms. With a cache directory the extracted
+# columns are also kept on disk (column_cache.py) and replayed chunk by chunk
+# while the databases do not change.
+import os
+import glob
+import sqlite3
+import numpy as np
+from contextlib import ExitStack
+from concurrent.futures import ProcessPoolExecutor
+import column_cache
+from qtaim_db import (BATCH, batches, list_systems, iter_columns, is_long,
+                      list_system_ids, iter_atoms)
+from stream_stats import StreamStats
+
+# Connections opened by the worker process, one per database
+_connections = {}
+
+
+def connect(path):
+    """Read-only connection, the file is not expected to change meanwhile"""
+    path = os.path.abspath(path)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"No such database: {path}")
+    return sqlite3.connect(f"file:{path}?mode=ro&immutable=1", uri=True)
+
+
+def expand(patterns):
+    """Database files from a list of paths and/or glob patterns"""
+    if isinstance(patterns, str):
+        patterns = [patterns]
+    paths = []
+    for pattern in patterns:
+        found = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        paths.extend(p for p in found if p not in paths)
+    return paths
+
+
+def plan(paths, where=None, batch=BATCH):
+    """Tasks (database, layout, systems, offset) covering every system once
+
+    Per-system tables are listed by name and `offset` is the index of the
+    first one among all the systems of the database, so the 'system' key of
+    the rows is the same whatever the split (see system_names). For the long
+    layout (migrate_atoms.py) the tasks hold system_id.
+    """
+    tasks = []
+    for path in paths:
+        conn = connect(path)
+        if is_long(conn):
+            layout, systems = 'atoms', list_system_ids(conn, where)
+        else:
+            layout, systems = 'tables', list_systems(conn, where)
+        conn.close()
+        tasks.extend((path, layout, group, offset)
+                     for offset, group in batches(systems, batch))
+    return tasks
+
+
+def task_chunks(task, columns, symbol=None):
+    """Chunks of `columns` of one task, read with the worker connection"""
+    path, layout, systems, offset = task
+    if path not in _connections:
+        _connections[path] = connect(path)
+    conn = _connections[path]
+    if layout == 'atoms':
+        return iter_atoms(conn, columns, symbol=symbol, ids=systems)
+    return iter_columns(conn, systems, columns, symbol=symbol, offset=offset)
+
+
+def reduce_task(task, columns, series, nseries, bins, symbol=None, part=None):
+    """StreamStats of the `nseries` arrays returned by `series(chunk)`
+
+    With `part` the chunks are also written to the cache. Returns the
+    accumulators and the number of rows of every chunk.
+    """
+    stats = [StreamStats(bins) for _ in range(nseries)]
+    sizes = []
+    for chunk in task_chunks(task, columns, symbol):
+        if part is not None:
+            column_cache.write_part(part, chunk)
+        sizes.append(len(chunk['system']))
+        for acc, x in zip(stats, series(chunk)):
+            acc.update(x)
+    return stats, sizes
+
+
+def reduce_cached(cached, series, nseries, bins):
+    """Same reduction as accumulate from the columns of a cache entry"""
+    data, chunks, nsystems = cached
+    stats = [StreamStats(bins) for _ in range(nseries)]
+    partial, current, start = None, None, 0
+    for task, rows in chunks:
+        # One partial accumulator per task, merged in order (as accumulate)
+        if task != current:
+            for acc, part in zip(stats, partial or []):
+                acc.merge(part)
+            partial, current = [StreamStats(bins) for _ in range(nseries)], task
+        chunk = {col: values[start:start + rows] for col, values in data.items()}
+        start += rows
+        for acc, x in zip(partial, series(chunk)):
+            acc.update(x)
+    for acc, part in zip(stats, partial or []):
+        acc.merge(part)
+    return stats, nsystems
+
+
+def accumulate(databases, columns, series, nseries, bins, where=None,
+               symbol=None, workers=None, batch=BATCH, cache=None):
+    """Merged StreamStats of every series over all the databases
+
+    `series` maps a chunk of `columns` to a list of `nseries` sample arrays;
+    it must be importable (module level) so the worker processes can run it.
+    `symbol` keeps only the atoms of one element. With workers=1 everything
+    runs in this process. `cache` is a directory where the extracted columns
+    are kept for the next runs. Returns the accumulators and the number of
+    systems.
+    """
+    paths = expand(databases)
+    if cache:
+        directory = column_cache.entry(cache, paths, columns, where, symbol, batch)
+        cached = column_cache.load(directory, paths)
+        if cached is not None:
+            return reduce_cached(cached, series, nseries, bins)
+
+    tasks = plan(paths, where, batch)
+    nsystems = sum(len(systems) for _, _, systems, _ in tasks)
+    if cache:
+        parts = column_cache.prepare(directory)
+        parts = [os.path.join(parts, str(i)) for i in range(len(tasks))]
+    else:
+        parts = [None]*len(tasks)
+    args = [[arg]*len(tasks) for arg in (columns, series, nseries, bins, symbol)]
+
+    stats = [StreamStats(bins) for _ in range(nseries)]
+    chunks = []
+    with ExitStack() as stack:
+        pool = stack.enter_context(ProcessPoolExecutor(workers)) if workers != 1 else None
+        results = (pool.map if pool else map)(reduce_task, tasks, *args, parts)
+        for i, (partial, sizes) in enumerate(results):
+            for acc, part in zip(stats, partial):
+                acc.merge(part)
+            chunks.extend((i, rows) for rows in sizes)
+
+    if cache:
+        dtypes = {'system': np.int64}
+        dtypes.update((col, object if col == 'symbol' else float) for col in columns)
+        column_cache.store(directory, paths, dtypes, parts, chunks, nsystems)
+    return stats, nsystems
+
+
+def nothing(chunk):
+    """No series at all, for runs that only fill the cache"""
+    return []
+
+
+def extract(databases, columns, where=None, symbol=None, workers=None,
+            batch=BATCH, cache=None):
+    """Whole `columns` of all the databases as arrays
+
+    With a cache the arrays are read-only memory maps of the cache entry
+    (built first if needed). The 'database' key holds the index in the
+    expanded list of databases of every row.
+    """
+    paths = expand(databases)
+    tasks = plan(paths, where, batch)
+    if cache:
+        accumulate(paths, columns, nothing, 0, [0, 1], where, symbol, workers,
+                   batch, cache)
+        directory = column_cache.entry(cache, paths, columns, where, symbol, batch)
+        data, chunks, _ = column_cache.load(directory, paths)
+        data = dict(data)
+    else:
+        pieces, chunks = [], []
+        for i, task in enumerate(tasks):
+            for chunk in task_chunks(task, columns, symbol):
+                pieces.append(chunk)
+                chunks.append((i, len(chunk['system'])))
+        chunks = np.array(chunks, dtype=np.int64).reshape(-1, 2)
+        data = {col: np.concatenate([p[col] for p in pieces]) if pieces
+                else np.empty(0) for col in ['system'] + list(columns)}
+
+    database = np.array([paths.index(path) for path, _, _, _ in tasks], dtype=np.int64)
+    data['database'] = np.repeat(database[chunks[:,0]], chunks[:,1])
+    return data
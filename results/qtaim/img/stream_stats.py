@@ -0,0 +1,192 @@
+#!/usr/bin/python3
+# Bounded-memory statistics for the ADF vs AIMAll difference plots
+#
+# The samples are consumed chunk by chunk and never kept: the accumulator only
+# stores the running moments, a quantile sketch and the histogram counts on
+# the fixed `bins` grid, so the memory does not grow with the database. The
+# KDE curves are computed from those counts too (binned KDE with FFTs).
+import numpy as np
+
+
+class StreamStats:
+    """Running mean/std (Welford), quantiles and histogram of a sample stream
+
+    Quantiles come from a log-bucketed sketch (DDSketch like): any value
+    returned by `quantile` is within a relative error `alpha` of a sample of
+    the requested rank, |q_est - q| <= alpha*|q|, as long as the samples lie
+    in [min_value, max_value] in absolute value (smaller ones count as zero,
+    bigger ones are clamped to the last bucket). NaN samples are ignored.
+    """
+
+    def __init__(self, bins, alpha=0.001, min_value=1e-9, max_value=1e9):
+        self.bins = np.asarray(bins, dtype=float)
+        self.counts = np.zeros(len(self.bins) - 1, dtype=np.int64)
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+        # Sketch buckets: index k holds the values in (gamma^(k-1), gamma^k]
+        self.alpha = alpha
+        self.min_value = min_value
+        self.gamma = (1 + alpha)/(1 - alpha)
+        self.log_gamma = np.log(self.gamma)
+        self.kmin = int(np.ceil(np.log(min_value)/self.log_gamma))
+        kmax = int(np.ceil(np.log(max_value)/self.log_gamma))
+        self.positive = np.zeros(kmax - self.kmin + 1, dtype=np.int64)
+        self.negative = np.zeros(kmax - self.kmin + 1, dtype=np.int64)
+        self.zero = 0
+
+    def update(self, x):
+        """Add a chunk of samples"""
+        x = np.asarray(x, dtype=float).ravel()
+        x = x[~np.isnan(x)]
+        n = len(x)
+        if n == 0:
+            return self
+
+        # Chan et al. combination of the chunk moments with the running ones
+        mean = x.mean()
+        m2 = np.sum((x - mean)**2)
+        self._combine(n, mean, m2)
+        self.min = min(self.min, x.min())
+        self.max = max(self.max, x.max())
+
+        # Same binning as np.histogram (samples out of the grid are dropped)
+        self.counts += np.histogram(x, self.bins)[0]
+
+        # Quantile sketch
+        size = len(self.positive)
+        small = np.abs(x) < self.min_value
+        self.zero += int(small.sum())
+        for values, buckets in ((x[~small & (x > 0)], self.positive),
+                                (-x[~small & (x < 0)], self.negative)):
+            k = np.ceil(np.log(values)/self.log_gamma).astype(np.int64)
+            k = np.clip(k - self.kmin, 0, size - 1)
+            buckets += np.bincount(k, minlength=size)
+        return self
+
+    def _combine(self, n, mean, m2):
+        if self.n == 0:
+            self.n, self.mean, self.m2 = n, mean, m2
+            return
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean += delta*n/total
+        self.m2 += m2 + delta**2*self.n*n/total
+        self.n = total
+
+    def merge(self, other):
+        """Add the samples seen by another accumulator (same bins and alpha)"""
+        if other.n == 0:
+            return self
+        self._combine(other.n, other.mean, other.m2)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.counts += other.counts
+        self.positive += other.positive
+        self.negative += other.negative
+        self.zero += other.zero
+        return self
+
+    @property
+    def var(self):
+        """Population variance (as np.var)"""
+        return self.m2/self.n if self.n else np.nan
+
+    @property
+    def std(self):
+        """Population standard deviation (as np.std)"""
+        return np.sqrt(self.var)
+
+    def quantile(self, q):
+        """Approximate q-quantile (relative error bounded by alpha)"""
+        if self.n == 0:
+            return np.nan
+        rank = q*(self.n - 1)
+        # Sorted order: negatives (largest magnitude first), zeros, positives
+        below = np.cumsum(self.negative[::-1])
+        if rank < below[-1]:
+            k = len(self.negative) - 1 - np.searchsorted(below, rank, side='right')
+            return -self._value(k)
+        rank -= below[-1]
+        if rank < self.zero:
+            return 0.0
+        rank -= self.zero
+        k = np.searchsorted(np.cumsum(self.positive), rank, side='right')
+        return self._value(min(k, len(self.positive) - 1))
+
+    def _value(self, k):
+        # Representative of bucket k, the relative error is at most alpha
+        return 2*self.gamma**(k + self.kmin)/(self.gamma + 1)
+
+    @property
+    def median(self):
+        return self.quantile(0.5)
+
+    @property
+    def centres(self):
+        return 0.5*(self.bins[1:] + self.bins[:-1])
+
+    def kde(self, bw_method='silverman', bw_adjust=1.0):
+        """Gaussian KDE at the bin centres from the binned counts"""
+        h = bandwidth(self.std, self.n, bw_method, bw_adjust)
+        return binned_kde(self.counts, self.bins, h, self.n)
+
+
+def bandwidth(std, n, bw_method='silverman', bw_adjust=1.0):
+    """Kernel width as scipy's gaussian_kde (used by seaborn) times bw_adjust"""
+    if bw_method == 'silverman':
+        factor = (n*3/4)**(-1/5)
+    elif bw_method == 'scott':
+        factor = n**(-1/5)
+    else:
+        factor = float(bw_method)
+    return bw_adjust*factor*std
+
+
+def binned_kde(counts, bins, h, n=None):
+    """Density of binned samples (uniform `bins`) convolved with a Gaussian
+
+    The samples sit at the bin centres and the convolution is done with FFTs,
+    O(G log G) for G bins whatever the number of samples. `n` normalises the
+    density (default: the samples in the grid).
+    """
+    counts = np.asarray(counts, dtype=float)
+    width = bins[1] - bins[0]
+    if not np.allclose(np.diff(bins), width):
+        raise ValueError("binned_kde needs a uniform grid of bins")
+    n = counts.sum() if n is None else n
+    if not h > 0:
+        return counts/(n*width)
+
+    # Kernel sampled on the grid up to 4 widths (or the whole grid)
+    size = len(counts)
+    k = min(size - 1, int(np.ceil(4*h/width)))
+    offsets = np.arange(-k, k + 1)*width
+    kernel = np.exp(-0.5*(offsets/h)**2)/(h*np.sqrt(2*np.pi))
+    length = 1 << int(np.ceil(np.log2(size + 2*k)))
+    conv = np.fft.irfft(np.fft.rfft(counts, length)*np.fft.rfft(kernel, length),
+                        length)
+    return np.clip(conv[k:k + size], 0, None)/n
+
+
+def histplot_counts(stats, kde=False, kde_kws=None, **kwargs):
+    """Draw the pre-binned counts of a StreamStats with sns.histplot
+
+    With kde=True the density (binned_kde with the bw_method and bw_adjust of
+    `kde_kws`) is drawn on top, scaled to counts like seaborn does.
+    """
+    import seaborn as sns
+    # bins as a list: with weights seaborn compares them against "auto"
+    ax = sns.histplot(x=stats.centres, weights=stats.counts,
+                      bins=stats.bins.tolist(), **kwargs)
+    if kde:
+        kde_kws = kde_kws or {}
+        density = stats.kde(kde_kws.get('bw_method', 'silverman'),
+                            kde_kws.get('bw_adjust', 1.0))
+        width = stats.bins[1] - stats.bins[0]
+        ax.plot(stats.centres, density*stats.n*width, color=kwargs.get('color'),
+                linewidth=2)
+    return ax
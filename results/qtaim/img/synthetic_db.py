@@ -0,0 +1,167 @@
+#!/usr/bin/python3
+# Synthetic QTAIM databases shaped like q_dp_pol.db and pol_150.db
+#
+# A `systems` table (system, natoms, normal_termination, aimall) and one table
+# per system with the symbol and the mu_* / pol_* columns of every atom.
+# Systems have 3-29 atoms of organic elements (GDB-like), the ADF values
+# are drawn per element and the AIMAll ones scattered around them, so the
+# differences look like the real ones. A few systems did not terminate
+# (normal_termination < 7, no polarisabilities) or have no AIMAll run
+# (NULL AIMAll columns). Everything is reproducible from the seed.
+#
+# The long layout (migrate_atoms.py) can be written directly. The wide one
+# gets slow for the largest sizes: SQLite scans its schema for every CREATE
+# TABLE, so a million atoms (~55000 tables) takes minutes.
+#
+# Usage: ./synthetic_db.py out.db --atoms 100000 [--kind pol_150] [--seed 0]
+#                          [--layout long]
+import os
+import argparse
+import sqlite3
+import numpy as np
+from qtaim_db import CHUNK, quote
+from migrate_atoms import index
+
+DIPOLES = ['mu_adf_norm', 'mu_aimall_norm',
+           'mu_adf_intra_norm', 'mu_aimall_intra_norm',
+           'mu_adf_inter_norm', 'mu_aimall_inter_norm']
+POLARISABILITIES = ['pol_l1_adf', 'pol_l2_adf', 'pol_l3_adf', 'pol_mean_adf',
+                    'pol_l1_aimall', 'pol_l2_aimall', 'pol_l3_aimall', 'pol_mean_aimall']
+KINDS = {'q_dp_pol': DIPOLES + POLARISABILITIES, 'pol_150': POLARISABILITIES}
+
+# Element: (frequency, atomic dipole [a.u.], isotropic polarisability [a.u.])
+ELEMENTS = {'H': (0.50, 0.15, 2.0), 'C': (0.33, 0.10, 6.5), 'N': (0.06, 0.30, 5.0),
+            'O': (0.09, 0.35, 4.5), 'F': (0.015, 0.25, 3.0), 'S': (0.005, 0.40, 14.0)}
+# Fraction of systems that failed, and of systems without AIMAll
+FAILED = 0.03
+NO_AIMALL = 0.05
+
+
+def system_sizes(natoms, rng):
+    """Number of atoms of every system, adding up to `natoms`"""
+    sizes = []
+    total = 0
+    while total < natoms:
+        draw = np.clip(np.rint(rng.normal(18, 5, 1024)), 3, 29).astype(np.int64)
+        sizes.append(draw)
+        total += draw.sum()
+    sizes = np.concatenate(sizes)
+    sizes = sizes[:np.searchsorted(np.cumsum(sizes), natoms) + 1]
+    sizes[-1] -= sizes.sum() - natoms
+    return sizes[sizes > 0]
+
+
+def atoms(n, rng):
+    """Symbols and {column: values} of `n` atoms (ADF and AIMAll)"""
+    names = list(ELEMENTS)
+    freq, dipole, alpha = np.array(list(ELEMENTS.values())).T
+    element = rng.choice(len(names), size=n, p=freq/freq.sum())
+    values = {}
+
+    # Intra (polarisation) and inter (charge transfer) parts at random angles
+    intra = rng.gamma(4, dipole[element]/4)
+    inter = rng.gamma(2, dipole[element]/4)
+    cos = rng.uniform(-1, 1, n)
+    total = np.sqrt(intra**2 + inter**2 + 2*intra*inter*cos)
+    for name, adf in (('', total), ('_intra', intra), ('_inter', inter)):
+        values[f'mu_adf{name}_norm'] = adf
+        aimall = adf*(1 + rng.normal(0, 0.05, n)) + rng.normal(0, 0.01, n)
+        values[f'mu_aimall{name}_norm'] = np.abs(aimall)
+
+    # Eigenvalues λ1 ≤ λ2 ≤ λ3 around the isotropic value of the element
+    mean = alpha[element]*rng.lognormal(0, 0.1, n)
+    spread = rng.normal(0, 1, (n, 3))*(mean*rng.uniform(0.05, 0.3, n))[:, None]
+    adf = np.sort(np.maximum(mean[:, None] + spread - spread.mean(axis=1, keepdims=True),
+                             0.1), axis=1)
+    aimall = np.sort(adf*(1 + rng.normal(0, 0.03, (n, 3))), axis=1)
+    for method, eig in (('adf', adf), ('aimall', aimall)):
+        for k in range(3):
+            values[f'pol_l{k + 1}_{method}'] = eig[:, k]
+        values[f'pol_mean_{method}'] = eig.mean(axis=1)
+    return np.array(names)[element], values
+
+
+def generate(path, natoms, kind='q_dp_pol', seed=0, layout='wide', chunk=CHUNK):
+    """Write a synthetic database of `natoms` atoms, returns the number of systems
+
+    `layout` is 'wide' (one table per system) or 'long' (the atoms table of
+    migrate_atoms.py, written directly).
+    """
+    if os.path.exists(path):
+        raise FileExistsError(f"{path} already exists, not overwriting it")
+    columns = KINDS[kind]
+    rng = np.random.default_rng(seed)
+    sizes = system_sizes(natoms, rng)
+    symbols, values = atoms(int(sizes.sum()), rng)
+    nsystems = len(sizes)
+    termination = np.where(rng.random(nsystems) < FAILED,
+                           rng.integers(0, 7, nsystems), 7)
+    aimall = (rng.random(nsystems) >= NO_AIMALL).astype(np.int64)
+
+    # Failed runs have no polarisabilities, no AIMAll run no AIMAll values
+    # (NaN is stored as NULL)
+    owner = np.repeat(np.arange(nsystems), sizes)
+    data = np.column_stack([values[col] for col in columns])
+    for j, col in enumerate(columns):
+        missing = np.zeros(nsystems, dtype=bool)
+        if col.startswith('pol_'):
+            missing |= termination < 7
+        if 'aimall' in col:
+            missing |= aimall == 0
+        data[missing[owner], j] = np.nan
+    systems = [(f"gdb_{i}", int(n), int(t), int(a))
+               for i, (n, t, a) in enumerate(zip(sizes, termination, aimall))]
+    definition = ", ".join(["symbol TEXT"] + [f"{col} REAL" for col in columns])
+    marks = ", ".join('?'*(len(columns) + 1))
+
+    conn = sqlite3.connect(path)
+    if layout == 'long':
+        conn.execute("CREATE TABLE systems (system_id INTEGER PRIMARY KEY, system TEXT, "
+                     "natoms INTEGER, normal_termination INTEGER, aimall INTEGER)")
+        conn.execute("CREATE TABLE atoms (atom_id INTEGER PRIMARY KEY, "
+                     "system_id INTEGER NOT NULL REFERENCES systems(system_id), "
+                     f"{definition})")
+        with conn:
+            conn.executemany("INSERT INTO systems VALUES (?, ?, ?, ?, ?)",
+                             [(i + 1, *row) for i, row in enumerate(systems)])
+            names = ", ".join(['symbol'] + columns)
+            for start in range(0, len(owner), chunk):
+                stop = start + chunk
+                conn.executemany(f"INSERT INTO atoms (system_id, {names}) VALUES (?, {marks})",
+                                 zip((owner[start:stop] + 1).tolist(),
+                                     symbols[start:stop].tolist(),
+                                     *data[start:stop].T.tolist()))
+        index(conn)
+        conn.close()
+        return nsystems
+
+    conn.execute("CREATE TABLE systems (system TEXT, natoms INTEGER, "
+                 "normal_termination INTEGER, aimall INTEGER)")
+    with conn:
+        conn.executemany("INSERT INTO systems VALUES (?, ?, ?, ?)", systems)
+        # All the tables at once; every CREATE TABLE scans the schema, so
+        # this step grows quadratically with the number of systems
+        conn.executescript("".join(f"CREATE TABLE {quote(f'gdb_{i}')} ({definition});\n"
+                                   for i in range(nsystems)))
+        bounds = np.concatenate([[0], np.cumsum(sizes)])
+        for i in range(nsystems):
+            start, stop = bounds[i], bounds[i + 1]
+            conn.executemany(f"INSERT INTO {quote(f'gdb_{i}')} VALUES ({marks})",
+                             zip(symbols[start:stop].tolist(), *data[start:stop].T.tolist()))
+    conn.close()
+    return nsystems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('database', help="new database")
+    parser.add_argument('--atoms', type=int, default=10000, help="total number of atoms")
+    parser.add_argument('--kind', choices=list(KINDS), default='q_dp_pol')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--layout', choices=['wide', 'long'], default='wide',
+                        help="one table per system or the long layout (migrate_atoms.py)")
+    args = parser.parse_args()
+
+    nsystems = generate(args.database, args.atoms, args.kind, args.seed, args.layout)
+    print(f"{nsystems} systems and {args.atoms} atoms written to {args.database} "
+          f"({args.layout} layout)")
@@ -0,0 +1,48 @@
+#!/usr/bin/python3
+# Folds of pol_model.py on synthetic databases (python -m pytest test_pol_model.py)
+import zlib
+import numpy as np
+import pytest
+import synthetic_db
+from shards import connect, plan, task_chunks
+from qtaim_db import system_names
+from pol_model import folds_of
+
+WHERE = "normal_termination = 7 AND aimall = 1"
+NFOLDS = 5
+
+
+def folds_by_name(path, where):
+    """{system name: fold} of the rows streamed from the database"""
+    conn = connect(path)
+    names = system_names(conn, where)
+    conn.close()
+    folds = {}
+    for task in plan([path], where, batch=7):
+        for chunk in task_chunks(task, ['pol_mean_adf']):
+            systems = np.unique(chunk['system'])
+            for key, fold in zip(systems, folds_of(path, systems, NFOLDS, where)):
+                folds.setdefault(names[key], set()).add(int(fold))
+    return folds
+
+
+@pytest.mark.parametrize('where', [None, WHERE])
+def test_folds_same_across_layouts(tmp_path, where):
+    folds = {}
+    for layout in ('wide', 'long'):
+        path = str(tmp_path/f"{layout}.db")
+        synthetic_db.generate(path, 3000, 'pol_150', seed=1, layout=layout)
+        folds[layout] = folds_by_name(path, where)
+    assert folds['wide'] == folds['long']
+    # One fold per system, the one of its name
+    names = list(folds['wide'])
+    h = np.array([zlib.crc32(name.encode()) for name in names],
+                 dtype=np.uint64)*np.uint64(0x9E3779B97F4A7C15)
+    expected = (h >> np.uint64(33)) % np.uint64(NFOLDS)
+    assert [folds['wide'][name] for name in names] == [{int(f)} for f in expected]
+
+
+def test_where_drops_systems(tmp_path):
+    path = str(tmp_path/"wide.db")
+    synthetic_db.generate(path, 3000, 'pol_150', seed=1)
+    assert len(folds_by_name(path, WHERE)) < len(folds_by_name(path, None))